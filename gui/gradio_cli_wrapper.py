@@ -1,18 +1,33 @@
-"""Minimal Gradio front-end that wraps inference.py via subprocess."""
+"""Minimal Gradio front-end that runs inference.py in-process with a resident, batching model host."""
 
 from __future__ import annotations
 
+import argparse
+import asyncio
+import os
 import shlex
-import subprocess
+import sqlite3
 import sys
+from functools import lru_cache
+from multiprocessing import shared_memory
 from pathlib import Path
-from typing import Iterable, Iterator, List
+from typing import AsyncIterator, List, Literal, Optional, Sequence, Tuple
 
 import gradio as gr
+import numpy as np
+import soundfile as sf
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 INFERENCE_SCRIPT = PROJECT_ROOT / "inference.py"
 
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import inference  # noqa: E402  (needs PROJECT_ROOT on sys.path)
+from gui.inference_host import InferenceError, InferenceHost  # noqa: E402
+from gui.result_cache import DEFAULT_MAX_BYTES, ResultCache  # noqa: E402
+
+
 DEFAULTS = {
     "model_type": "bs_roformer",
     "config_path": "ckpt/bs_rofomer/BS-Rofo-SW-Fixed.yaml",
@@ -20,58 +35,285 @@ DEFAULTS = {
     "input_file": "audio/sea.wav",
     "store_dir": "separated/",
     "device_ids": "0",
+    "input_folder": "audio/",
 }
 
+Precision = Literal["auto", "fp32", "bf16", "fp16"]
+PRECISIONS = ("auto", "fp32", "bf16", "fp16")
+
+# Fixed head of every displayed command, and the default store_dir resolved
+# once, so per-click work is limited to the variable arguments.
+_CMD_PREFIX: Tuple[str, ...] = (sys.executable, str(INFERENCE_SCRIPT))
+_STORE_DIR_DEFAULT_ABS = str(Path(DEFAULTS["store_dir"]).resolve())
+
+# Files picked up from `input_folder` in folder mode.
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".m4a")
+
+# Only the end of a request's log is shown (and cached); tqdm prints a frame
+# per chunk, so the full log of a long run is mostly progress-bar redraws.
+_LOG_TAIL_CHARS = 16_384
+
 
 def build_command(
     *,
     model_type: str,
     config_path: str,
     start_check_point: str,
-    input_file: str,
     store_dir: str,
     extract_instrumental: bool,
     use_tta: bool,
     force_cpu: bool,
     device_ids: str,
+    input_file: Optional[str] = None,
+    input_folder: Optional[str] = None,
+    input_files: Sequence[str] = (),
+    use_flash_attn: bool = True,
+    precision: Precision = "auto",
+    jit_trace: bool = False,
 ) -> List[str]:
-    """Construct the CLI command used to launch inference.py."""
+    """Construct the equivalent inference.py CLI command (shown in the logs)."""
+
+    params = dict(
+        model_type=model_type,
+        config_path=config_path,
+        start_check_point=start_check_point,
+        store_dir=store_dir,
+        extract_instrumental=extract_instrumental,
+        use_tta=use_tta,
+        force_cpu=force_cpu,
+        device_ids=device_ids,
+        input_file=input_file,
+        input_folder=input_folder,
+        input_files=tuple(input_files),
+        use_flash_attn=use_flash_attn,
+        precision=precision,
+        jit_trace=jit_trace,
+    )
+    return list(_build_command_cached(tuple(sorted(params.items()))))
+
 
+# Agents tend to resend identical parameters; the cached tuple is copied into a
+# fresh list so callers can still modify the returned command.
+@lru_cache(maxsize=256)
+def _build_command_cached(params: Tuple[Tuple[str, object], ...]) -> Tuple[str, ...]:
+    p = dict(params)
     cmd: List[str] = [
-        sys.executable,
-        str(INFERENCE_SCRIPT),
+        *_CMD_PREFIX,
         "--model_type",
-        model_type,
+        p["model_type"],
         "--config_path",
-        config_path,
+        p["config_path"],
         "--start_check_point",
-        start_check_point,
-        "--input_file",
-        input_file,
-        "--store_dir",
-        store_dir,
+        p["start_check_point"],
     ]
-
-    if extract_instrumental:
+    if p["input_file"]:
+        cmd += ["--input_file", p["input_file"]]
+    if p["input_folder"]:
+        cmd += ["--input_folder", p["input_folder"]]
+    if p["input_files"]:
+        cmd += ["--input_files", *p["input_files"]]
+    cmd += ["--store_dir", p["store_dir"]]
+
+    if p["extract_instrumental"]:
         cmd.append("--extract_instrumental")
-    if use_tta:
+    if p["use_tta"]:
         cmd.append("--use_tta")
-    if force_cpu:
+    if p["force_cpu"]:
         cmd.append("--force_cpu")
+    cmd += ["--attn_impl", "flash" if p["use_flash_attn"] else "eager"]
+    cmd += ["--precision", p["precision"]]
+    if p["jit_trace"]:
+        cmd.append("--jit_trace")
 
-    device_ids = (device_ids or "").strip()
+    device_ids = (p["device_ids"] or "").strip()
     if device_ids:
         cmd.append("--device_ids")
         cmd.extend(_split_device_ids(device_ids))
 
-    return cmd
+    return tuple(cmd)
+
 
+@lru_cache(maxsize=32)
+def _split_device_ids(value: str) -> Tuple[str, ...]:
+    return tuple(value.replace(",", " ").split())
 
-def _split_device_ids(value: str) -> Iterable[str]:
-    return value.replace(",", " ").split()
 
+def _last_frame(line: str) -> str:
+    # Drop what a carriage return overwrote; a trailing "\r" may still be
+    # followed by "\n" in the next chunk, so it does not clear the line.
+    return line[line.rfind("\r", 0, len(line) - 1) + 1 :]
 
-def run_inference(
+
+class _LogTail:
+    """Displayed log of one request: tqdm redraws collapsed, bounded to `_LOG_TAIL_CHARS`."""
+
+    def __init__(self) -> None:
+        self._done = ""  # finished lines
+        self._line = ""  # line still being written
+
+    def append(self, chunk: str) -> None:
+        lines = (self._line + chunk).split("\n")
+        self._line = _last_frame(lines.pop())
+        if lines:
+            self._done += "".join(_last_frame(line).rstrip("\r") + "\n" for line in lines)
+            if len(self._done) > 2 * _LOG_TAIL_CHARS:
+                self._done = self._done[-_LOG_TAIL_CHARS:]
+
+    def __str__(self) -> str:
+        return (self._done + self._line)[-_LOG_TAIL_CHARS:]
+
+
+def _normalize_store_dir(store_dir: str) -> str:
+    """Make `store_dir` absolute so workers and the result cache agree on it."""
+    if store_dir == DEFAULTS["store_dir"]:
+        return _STORE_DIR_DEFAULT_ABS
+    return os.path.abspath(store_dir)
+
+
+# Shared by every click / MCP call: one resident model per default GPU, with
+# concurrent requests for the same model drained together into batched passes.
+HOST = InferenceHost(
+    device_ids=[int(x) for x in _split_device_ids(DEFAULTS["device_ids"])],
+    max_batch_size=4,
+    timeout_ms=50,
+)
+
+# Repeated runs on the same audio with the same model/options are served from the
+# result cache, created on first use. main() can resize it; 0 disables it.
+CACHE_MAX_BYTES = DEFAULT_MAX_BYTES
+
+
+@lru_cache(maxsize=1)
+def _result_cache() -> Optional[ResultCache]:
+    if CACHE_MAX_BYTES <= 0:
+        return None
+    return ResultCache(max_bytes=CACHE_MAX_BYTES)
+
+
+def validate_inputs(
+    *,
+    config_path: str,
+    start_check_point: str,
+    device_ids: str,
+    input_file: Optional[str] = None,
+    precision: str = "auto",
+) -> Optional[str]:
+    """Cheap checks run before queueing a request; returns an error message or None."""
+
+    # MCP calls reach build_args without argparse's choices check.
+    if precision not in PRECISIONS:
+        return f"Error: precision {precision!r} must be one of {', '.join(PRECISIONS)}."
+
+    required = [("config_path", config_path)]
+    if input_file is not None:
+        required.insert(0, ("input_file", input_file))
+    if start_check_point:
+        required.append(("start_check_point", start_check_point))
+    for name, path in required:
+        if not path or not Path(path).is_file():
+            return f"Error: {name} {path!r} is not an existing file."
+    try:
+        ids = [int(x) for x in _split_device_ids((device_ids or "").strip())]
+    except ValueError:
+        return f"Error: device_ids {device_ids!r} must be integers separated by spaces or commas."
+    if not HOST.serves(ids):
+        return (
+            f"Error: no inference worker runs on device_ids {device_ids!r}; "
+            f"workers run on {DEFAULTS['device_ids']!r}."
+        )
+    return None
+
+
+def build_args(
+    *,
+    model_type: str,
+    config_path: str,
+    start_check_point: str,
+    store_dir: str,
+    extract_instrumental: bool,
+    use_tta: bool,
+    force_cpu: bool,
+    device_ids: str,
+    input_file: Optional[str] = None,
+    input_folder: Optional[str] = None,
+    input_files: Sequence[str] = (),
+    use_flash_attn: bool = True,
+    precision: Precision = "auto",
+    jit_trace: bool = False,
+):
+    """Construct the argparse namespace passed to the inference host."""
+
+    dict_args = {
+        "model_type": model_type,
+        "config_path": config_path,
+        "start_check_point": start_check_point,
+        "input_file": input_file,
+        "input_folder": input_folder,
+        "input_files": list(input_files) or None,
+        "store_dir": store_dir,
+        "extract_instrumental": extract_instrumental,
+        "use_tta": use_tta,
+        "force_cpu": force_cpu,
+        "attn_impl": "flash" if use_flash_attn else "eager",
+        "precision": precision,
+        "jit_trace": jit_trace,
+    }
+    # Empty device_ids: any worker may take the request.
+    ids = [int(x) for x in _split_device_ids((device_ids or "").strip())] or [
+        device_id for device_id in HOST.device_ids if device_id is not None
+    ]
+    if ids:
+        dict_args["device_ids"] = ids
+    return inference.parse_args_inference(dict_args)
+
+
+def _share_audio(input_file: str) -> Optional[Tuple[shared_memory.SharedMemory, dict]]:
+    """Decode `input_file` into a shared-memory block the inference worker can read.
+
+    Returns the block (release it with `_release_shared`) and the spec to set
+    as `args.input_shm`, or None if soundfile cannot decode the file or the
+    audio does not fit in /dev/shm, in which case the worker falls back to
+    loading the path itself.
+    """
+    try:
+        audio, sr = sf.read(input_file, dtype="float32", always_2d=True)
+    except Exception:
+        return None
+    if not _fits_in_shm(audio.nbytes):
+        return None
+    audio = audio.T  # (channels, samples), as librosa returns it
+    shm = shared_memory.SharedMemory(create=True, size=max(audio.nbytes, 1))
+    np.ndarray(audio.shape, dtype=audio.dtype, buffer=shm.buf)[:] = audio
+    spec = {
+        "path": os.path.abspath(input_file),  # matched against inference's own abspath
+        "name": shm.name,
+        "shape": audio.shape,
+        "dtype": audio.dtype.str,
+        "sr": sr,
+    }
+    return shm, spec
+
+
+def _fits_in_shm(nbytes: int) -> bool:
+    # Writing past the free space of /dev/shm (64 MB by default in Docker)
+    # raises SIGBUS, which kills the process instead of raising.
+    try:
+        stat = os.statvfs("/dev/shm")
+    except (AttributeError, OSError):
+        return True  # no /dev/shm to fill (Windows, macOS)
+    return nbytes <= stat.f_bavail * stat.f_frsize
+
+
+def _release_shared(sharing: "asyncio.Future[Optional[Tuple[shared_memory.SharedMemory, dict]]]") -> None:
+    """Done callback unlinking the block created by `_share_audio`, if any."""
+    if sharing.cancelled() or sharing.exception() is not None or sharing.result() is None:
+        return
+    shm = sharing.result()[0]
+    shm.close()
+    shm.unlink()
+
+
+async def run_inference(
     input_file: str,
     store_dir: str,
     model_type: str = DEFAULTS["model_type"],
@@ -81,8 +323,11 @@ def run_inference(
     use_tta: bool = False,
     force_cpu: bool = False,
     device_ids: str = DEFAULTS["device_ids"],
-) -> str:
-    """Run inference.py as a subprocess and capture its output.
+    use_flash_attn: bool = True,
+    precision: Precision = "auto",
+    jit_trace: bool = False,
+) -> AsyncIterator[str]:
+    """Queue the file on the in-process inference host and stream its output.
         audio file(song.wav/.mp3/etc) will be separated into store_dir/song/{tracks}.wav
 
         you may just need to fill in input_file and store_dir,
@@ -104,12 +349,27 @@ def run_inference(
         extract_instrumental: Whether to extract instrumental track.
         use_tta: Whether to use test-time augmentation.
         force_cpu: Whether to force CPU usage.
-        device_ids: Device IDs to use.
+        device_ids: GPU ids (separated by spaces or commas) the request may run on; it is queued on the least busy of their workers. The server runs one worker per GPU in DEFAULTS["device_ids"], other ids are rejected. Leave empty for any.
+        use_flash_attn: Whether to use fused (flash / memory-efficient) attention for RoFormer-family models; off uses the plain (eager) attention path.
+        precision: Inference precision, one of auto, fp32, bf16, fp16. auto is bf16 on GPU and fp32 on CPU. bf16/fp16 halve memory traffic; bf16 falls back to fp16 on GPUs without bf16.
+        jit_trace: Whether to run a cached TorchScript trace of the model instead of eager PyTorch.
 
     """
     if input_file == store_dir:
-        return "Error: input_file and store_dir must be different to avoid overwriting files."
-    cmd = build_command(
+        yield "Error: input_file and store_dir must be different to avoid overwriting files."
+        return
+    store_dir = _normalize_store_dir(store_dir)
+    error = validate_inputs(
+        config_path=config_path,
+        start_check_point=start_check_point,
+        device_ids=device_ids,
+        input_file=input_file,
+        precision=precision,
+    )
+    if error:
+        yield error
+        return
+    options = dict(
         model_type=model_type,
         config_path=config_path,
         start_check_point=start_check_point,
@@ -119,30 +379,298 @@ def run_inference(
         use_tta=use_tta,
         force_cpu=force_cpu,
         device_ids=device_ids,
+        use_flash_attn=use_flash_attn,
+        precision=precision,
+        jit_trace=jit_trace,
     )
+    cmd = build_command(**options)
+
+    quoted_cmd = shlex.join(cmd)
+    args = build_args(**options)
+    header = f"$ {quoted_cmd}\n\n"
+
+    target_dir = Path(store_dir) / Path(input_file).stem
+    cache = await asyncio.to_thread(_result_cache)
+    if cache is not None:
+        cache_key = await asyncio.to_thread(
+            cache.key,
+            input_file,
+            dict(
+                model_type=model_type,
+                config_path=config_path,
+                start_check_point=start_check_point,
+                extract_instrumental=extract_instrumental,
+                use_tta=use_tta,
+                use_flash_attn=use_flash_attn,
+                # "auto" precision and the kernels used differ between CPU and GPU
+                force_cpu=force_cpu,
+                precision=precision,
+            ),
+        )
+        try:
+            cached_log = await asyncio.to_thread(cache.restore, cache_key, target_dir)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Cannot restore cached result, separating again. Error message: {e}")
+            cached_log = None
+        if cached_log is not None:
+            yield header + f"Restored cached result into {target_dir}.\n\n{cached_log}"
+            return
+
+    sharing = asyncio.ensure_future(asyncio.to_thread(_share_audio, input_file))
+    log = _LogTail()
+    outputs: List[str] = []
+    try:
+        # Shielded so a cancelled request still gets the block to release below.
+        shared = await asyncio.shield(sharing)
+        if shared is not None:
+            args.input_shm = shared[1]
+
+        yield header
+        async for chunk in HOST.astream(args, outputs):
+            log.append(chunk)
+            yield header + str(log)
+    except InferenceError as e:
+        # Nothing is cached for a failed run, even if some stems were written.
+        yield header + f"{log}\n{e}"
+        return
+    finally:
+        sharing.add_done_callback(_release_shared)
+
+    if cache is not None:
+        # Only the files this run reported, not whatever else is in target_dir.
+        try:
+            await asyncio.to_thread(cache.store, cache_key, target_dir, outputs, str(log).strip())
+        except (OSError, sqlite3.Error) as e:
+            # The stems are written; a cache that cannot keep them is no error for the caller.
+            print(f"Cannot cache result. Error message: {e}")
+
+
+async def run_inference_folder(
+    input_folder: str,
+    store_dir: str,
+    model_type: str = DEFAULTS["model_type"],
+    config_path: str = DEFAULTS["config_path"],
+    start_check_point: str = DEFAULTS["start_check_point"],
+    extract_instrumental: bool = False,
+    use_tta: bool = False,
+    force_cpu: bool = False,
+    device_ids: str = DEFAULTS["device_ids"],
+    use_flash_attn: bool = True,
+    precision: Precision = "auto",
+    jit_trace: bool = False,
+) -> AsyncIterator[str]:
+    """Separate every audio file in a folder, spread over all inference workers, and stream the output.
+        each file(song.wav/.mp3/etc) under input_folder will be separated into store_dir/song/{tracks}.wav
 
-    quoted_cmd = " ".join(shlex.quote(part) for part in cmd)
+        the files are split into one shard per GPU in device_ids and the shards run in parallel.
 
-    try:
-        completed = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=False,
-        )
-    except FileNotFoundError as exc:
-        return f"Failed to run inference script: {exc}\nCommand: {quoted_cmd}"
-
-    output_sections = [
-        f"$ {quoted_cmd}",
-        "",
-        completed.stdout.strip(),
-        completed.stderr.strip(),
+        for agent:
+        this function may take a long time to finish(about 1 min per song), depending on the model and hardware you use.
+        you'd better use absolute path for folder to avoid confusion.
+
+
+    Args:
+        input_folder: Path to a folder of audio files (searched recursively).
+        store_dir: Path to output folder. each file will have its own subfolder under store_dir to store the separated tracks. Attention: you'd better use an empty folder for this argument to avoid mixing old and new results.
+        model_type: Model type to use.
+        config_path: Path to model config file.
+        start_check_point: Path to model checkpoint file.
+        extract_instrumental: Whether to extract instrumental track.
+        use_tta: Whether to use test-time augmentation.
+        force_cpu: Whether to force CPU usage.
+        device_ids: GPU ids (separated by spaces or commas) to spread the files over, one shard per GPU. The server runs one worker per GPU in DEFAULTS["device_ids"], other ids are rejected. Leave empty for all of them.
+        use_flash_attn: Whether to use fused (flash / memory-efficient) attention for RoFormer-family models; off uses the plain (eager) attention path.
+        precision: Inference precision, one of auto, fp32, bf16, fp16. auto is bf16 on GPU and fp32 on CPU. bf16/fp16 halve memory traffic; bf16 falls back to fp16 on GPUs without bf16.
+        jit_trace: Whether to run a cached TorchScript trace of the model instead of eager PyTorch.
+
+    """
+    if input_folder == store_dir:
+        yield "Error: input_folder and store_dir must be different to avoid overwriting files."
+        return
+    store_dir = _normalize_store_dir(store_dir)
+    if not Path(input_folder).is_dir():
+        yield f"Error: input_folder {input_folder} is not a directory."
+        return
+    error = validate_inputs(
+        config_path=config_path,
+        start_check_point=start_check_point,
+        device_ids=device_ids,
+        precision=precision,
+    )
+    if error:
+        yield error
+        return
+
+    files = await asyncio.to_thread(_list_audio_files, input_folder)
+    if not files:
+        yield f"Error: no audio files ({', '.join(AUDIO_EXTENSIONS)}) found in {input_folder}."
+        return
+
+    options = dict(
+        model_type=model_type,
+        config_path=config_path,
+        start_check_point=start_check_point,
+        input_folder=input_folder,
+        store_dir=store_dir,
+        extract_instrumental=extract_instrumental,
+        use_tta=use_tta,
+        force_cpu=force_cpu,
+        device_ids=device_ids,
+        use_flash_attn=use_flash_attn,
+        precision=precision,
+        jit_trace=jit_trace,
+    )
+    quoted_cmd = shlex.join(build_command(**options))
+
+    devices = _split_device_ids((device_ids or "").strip()) or tuple(
+        str(device_id) for device_id in HOST.device_ids if device_id is not None
+    ) or ("",)
+    n = min(len(devices), len(files))
+    shard_args = [
+        build_args(**{**options, "device_ids": devices[i]}, input_files=files[i::n])
+        for i in range(n)
     ]
-    return "\n".join(section for section in output_sections if section)
 
+    header = f"$ {quoted_cmd}\n\n{len(files)} file(s) in {n} shard(s).\n\n"
+    yield header
+    async for logs in _merge_streams([HOST.astream(args) for args in shard_args]):
+        yield header + "\n\n".join(
+            f"[shard {i + 1}/{n}]\n{log}" for i, log in enumerate(logs)
+        )
+
+
+async def run_inference_batch(
+    input_files: List[str],
+    store_dir: str,
+    model_type: str = DEFAULTS["model_type"],
+    config_path: str = DEFAULTS["config_path"],
+    start_check_point: str = DEFAULTS["start_check_point"],
+    extract_instrumental: bool = False,
+    use_tta: bool = False,
+    force_cpu: bool = False,
+    device_ids: str = DEFAULTS["device_ids"],
+    use_flash_attn: bool = True,
+    precision: Precision = "auto",
+    jit_trace: bool = False,
+) -> AsyncIterator[str]:
+    """Separate a list of audio files in one request and stream the output.
+        each file(song.wav/.mp3/etc) in input_files will be separated into store_dir/song/{tracks}.wav
+
+        the whole list is handed to one inference worker, which batches the chunks
+        of all files together, so prefer this over many single-file calls.
+
+        for agent:
+        this function may take a long time to finish(about 1 min per song), depending on the model and hardware you use.
+        you'd better use absolute paths to avoid confusion.
+
+
+    Args:
+        input_files: Paths to the input audio files.
+        store_dir: Path to output folder. each file will have its own subfolder under store_dir to store the separated tracks. Attention: you'd better use an empty folder for this argument to avoid mixing old and new results.
+        model_type: Model type to use.
+        config_path: Path to model config file.
+        start_check_point: Path to model checkpoint file.
+        extract_instrumental: Whether to extract instrumental track.
+        use_tta: Whether to use test-time augmentation.
+        force_cpu: Whether to force CPU usage.
+        device_ids: GPU ids (separated by spaces or commas) the request may run on; it is queued on the least busy of their workers. The server runs one worker per GPU in DEFAULTS["device_ids"], other ids are rejected. Leave empty for any.
+        use_flash_attn: Whether to use fused (flash / memory-efficient) attention for RoFormer-family models; off uses the plain (eager) attention path.
+        precision: Inference precision, one of auto, fp32, bf16, fp16. auto is bf16 on GPU and fp32 on CPU. bf16/fp16 halve memory traffic; bf16 falls back to fp16 on GPUs without bf16.
+        jit_trace: Whether to run a cached TorchScript trace of the model instead of eager PyTorch.
+
+    """
+    if not input_files:
+        yield "Error: input_files is empty."
+        return
+    store_dir = _normalize_store_dir(store_dir)
+    error = validate_inputs(
+        config_path=config_path,
+        start_check_point=start_check_point,
+        device_ids=device_ids,
+        precision=precision,
+    )
+    missing = [path for path in input_files if not Path(path).is_file()]
+    if not error and missing:
+        error = f"Error: input_files {missing!r} are not existing files."
+    if error:
+        yield error
+        return
+
+    options = dict(
+        model_type=model_type,
+        config_path=config_path,
+        start_check_point=start_check_point,
+        input_files=[os.path.abspath(path) for path in input_files],
+        store_dir=store_dir,
+        extract_instrumental=extract_instrumental,
+        use_tta=use_tta,
+        force_cpu=force_cpu,
+        device_ids=device_ids,
+        use_flash_attn=use_flash_attn,
+        precision=precision,
+        jit_trace=jit_trace,
+    )
+    header = f"$ {shlex.join(build_command(**options))}\n\n{len(input_files)} file(s).\n\n"
+    args = build_args(**options)
+
+    yield header
+    log = _LogTail()
+    try:
+        async for chunk in HOST.astream(args):
+            log.append(chunk)
+            yield header + str(log)
+    except InferenceError as e:
+        yield header + f"{log}\n{e}"
+
+
+def _list_audio_files(input_folder: str) -> List[str]:
+    return sorted(
+        str(p)
+        for p in Path(input_folder).rglob("*")
+        if p.is_file() and p.suffix.lower() in AUDIO_EXTENSIONS
+    )
+
+
+async def _merge_streams(
+    streams: Sequence[AsyncIterator[str]],
+) -> AsyncIterator[List[str]]:
+    """Consume several log streams concurrently, yielding every stream's log tail so far."""
+
+    events: "asyncio.Queue[Tuple[int, Optional[str]]]" = asyncio.Queue()
+
+    async def pump(index: int, stream: AsyncIterator[str]) -> None:
+        try:
+            async for chunk in stream:
+                events.put_nowait((index, chunk))
+        except InferenceError as e:
+            events.put_nowait((index, f"\n{e}\n"))
+        finally:
+            events.put_nowait((index, None))
+
+    tasks = [asyncio.create_task(pump(i, stream)) for i, stream in enumerate(streams)]
+    try:
+        logs = [_LogTail() for _ in streams]
+        remaining = len(streams)
+        while remaining:
+            index, chunk = await events.get()
+            if chunk is None:
+                remaining -= 1
+                continue
+            logs[index].append(chunk)
+            yield [str(log) for log in logs]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+MODES = ("file", "folder")
+
+
+def create_demo(mode: str = "file") -> gr.Blocks:
+    """Build the UI for one input mode: a single `input_file`, or every file in `input_folder`."""
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
 
-def create_demo() -> gr.Blocks:
     with gr.Blocks() as demo:
         gr.Markdown(
             """
@@ -166,23 +694,34 @@ def create_demo() -> gr.Blocks:
         checkpoint_path = gr.Textbox(
             label="Checkpoint Path", value=DEFAULTS["start_check_point"]
         )
-        input_file = gr.Textbox(label="Input File", value=DEFAULTS["input_file"])
+        if mode == "folder":
+            input_path = gr.Textbox(
+                label="Input Folder", value=DEFAULTS["input_folder"]
+            )
+        else:
+            input_path = gr.Textbox(label="Input File", value=DEFAULTS["input_file"])
         store_dir = gr.Textbox(label="Store Dir", value=DEFAULTS["store_dir"])
 
+        precision = gr.Radio(
+            list(PRECISIONS), label="Precision", value="auto"
+        )
+
         with gr.Row():
             extract_instrumental = gr.Checkbox(
                 label="Extract Instrumental", value=False
             )
             use_tta = gr.Checkbox(label="Use TTA (slower)", value=False)
             force_cpu = gr.Checkbox(label="Force CPU", value=False)
+            use_flash_attn = gr.Checkbox(label="Flash attention", value=True)
+            jit_trace = gr.Checkbox(label="TorchScript trace", value=False)
 
         run_button = gr.Button("Run inference")
         logs = gr.Textbox(label="CLI output", lines=20)
 
         run_button.click(
-            fn=run_inference,
+            fn=run_inference_folder if mode == "folder" else run_inference,
             inputs=[
-                input_file,
+                input_path,
                 store_dir,
                 model_type,
                 config_path,
@@ -191,18 +730,89 @@ def create_demo() -> gr.Blocks:
                 use_tta,
                 force_cpu,
                 device_ids,
+                use_flash_attn,
+                precision,
+                jit_trace,
             ],
             outputs=logs,
         )
 
+        # API/MCP-only tool: agents can pass many files in one call.
+        gr.api(run_inference_batch, api_name="run_inference_batch")
+
+    # Handlers only await the host, so many clicks / MCP calls can wait at once
+    # without tying up worker threads; the host batches them.
+    demo.queue(default_concurrency_limit=8)
     return demo
 
 
-demo = create_demo()
+_DEMO: Optional[gr.Blocks] = None
+
+
+def __getattr__(name: str):
+    # `demo` is built on first access (e.g. `gradio mcp gui.gradio_cli_wrapper:demo`)
+    # rather than at import, so main() can build it for the requested mode only.
+    global _DEMO
+    if name == "demo":
+        if _DEMO is None:
+            _DEMO = create_demo()
+        return _DEMO
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Upper bound on the start-up warm-up (model load + first pass); the UI starts either way.
+WARMUP_TIMEOUT_S = 600
+
+
+def warm_up_host() -> None:
+    """Load the default model on every worker and run one dummy pass before serving."""
+    error = validate_inputs(
+        config_path=DEFAULTS["config_path"],
+        start_check_point=DEFAULTS["start_check_point"],
+        device_ids=DEFAULTS["device_ids"],
+    )
+    if error:
+        print(f"Skipping warm-up: {error}")
+        return
+    print("Warming up inference workers...")
+    ready = HOST.warm_up(
+        build_args(
+            model_type=DEFAULTS["model_type"],
+            config_path=DEFAULTS["config_path"],
+            start_check_point=DEFAULTS["start_check_point"],
+            store_dir=_STORE_DIR_DEFAULT_ABS,
+            extract_instrumental=False,
+            use_tta=False,
+            force_cpu=False,
+            device_ids=DEFAULTS["device_ids"],
+        ),
+        timeout=WARMUP_TIMEOUT_S,
+    )
+    if not ready:
+        print("Warm-up did not finish on every worker; serving anyway, workers restart on demand.")
 
 
 def main() -> None:
-    demo.launch(mcp_server=True, server_port=7867)
+    global _DEMO, CACHE_MAX_BYTES
+    parser = argparse.ArgumentParser(description="BS-RoFormer Gradio UI / MCP server")
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        default="file",
+        help="separate a single input file, or every audio file in an input folder",
+    )
+    parser.add_argument(
+        "--cache_max_gb",
+        type=float,
+        default=DEFAULT_MAX_BYTES / 1024**3,
+        help="size limit of the result cache; least recently used entries are evicted, 0 disables it",
+    )
+    args = parser.parse_args()
+
+    CACHE_MAX_BYTES = int(args.cache_max_gb * 1024**3)
+    _DEMO = create_demo(args.mode)
+    warm_up_host()
+    _DEMO.launch(mcp_server=True, server_port=7867)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,384 @@
+"""Worker processes that batch concurrent inference requests onto resident models, one per GPU."""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+import traceback
+from typing import AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import torch
+
+import inference
+
+# forkserver imports torch/inference once in the server process and forks
+# workers from it, so starting a worker neither re-imports torch nor inherits a
+# CUDA context from the Gradio process. Windows only has spawn.
+_START_METHOD = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+_PRELOAD = ["inference", "gui.inference_host"]
+
+
+class JobResult(NamedTuple):
+    """Outcome of a request, sent back once it is done."""
+
+    ok: bool
+    # stem files written for the request
+    outputs: Tuple[str, ...] = ()
+
+
+class InferenceError(RuntimeError):
+    """Raised by `InferenceHost.astream` after the log of a failed request."""
+
+
+# (job id, args) sent to the worker, (job id, log chunk or final JobResult) sent back.
+_Job = Tuple[int, argparse.Namespace]
+_Event = Tuple[int, Union[str, JobResult]]
+# Parent-side callback receiving a request's log chunks and finally its JobResult.
+_Deliver = Callable[[Union[str, JobResult]], None]
+
+
+class _LogStream(io.TextIOBase):
+    """Write-only text stream that forwards every write to the unfinished jobs of a group.
+
+    Within `only(job_id)`, writes go to that job alone.
+    """
+
+    def __init__(self, events: "mp.Queue[_Event]", job_ids: List[int]) -> None:
+        self._events = events
+        self._job_ids = job_ids
+        self._owner: Optional[int] = None
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            for job_id in self._job_ids if self._owner is None else [self._owner]:
+                self._events.put((job_id, text))
+        return len(text)
+
+    @contextlib.contextmanager
+    def only(self, job_id: int) -> Iterator[None]:
+        previous, self._owner = self._owner, job_id
+        try:
+            yield
+        finally:
+            self._owner = previous
+
+
+def _next_batch(jobs: "mp.Queue[_Job]", max_batch_size: int, timeout_ms: int) -> List[_Job]:
+    batch = [jobs.get()]
+    deadline = time.monotonic() + timeout_ms / 1000
+    while len(batch) < max_batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(jobs.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _group(batch: List[_Job]) -> Dict[tuple, List[_Job]]:
+    groups: Dict[tuple, List[_Job]] = {}
+    for job_id, args in batch:
+        try:
+            key = inference.model_key(args)
+        except Exception:
+            # Malformed args: run alone so the error is reported to this caller only.
+            key = (job_id,)
+        groups.setdefault(key, []).append((job_id, args))
+    return groups
+
+
+def _run_group(events: "mp.Queue[_Event]", group: List[_Job]) -> None:
+    job_ids = [job_id for job_id, _ in group]
+    unfinished = list(job_ids)
+    log = _LogStream(events, unfinished)
+
+    def finish(index: int, ok: bool, outputs: List[str]) -> None:
+        # Release a request as soon as it is done, not when the group ends.
+        unfinished.remove(job_ids[index])
+        events.put((job_ids[index], JobResult(ok, tuple(outputs))))
+
+    with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        if len(group) > 1:
+            print(f"Batched {len(group)} requests into one pass.")
+        try:
+            inference.run_batch(
+                [args for _, args in group],
+                on_done=finish,
+                request_log=lambda index: log.only(job_ids[index]),
+            )
+        except Exception:
+            traceback.print_exc()
+    # Only left over if run_batch raised.
+    for job_id in unfinished:
+        events.put((job_id, JobResult(False)))
+
+
+def _worker_main(
+    jobs: "mp.Queue[_Job]",
+    events: "mp.Queue[_Event]",
+    max_batch_size: int,
+    timeout_ms: int,
+    device_id: Optional[int],
+    warmup_args: Optional[argparse.Namespace],
+    ready: "mp.synchronize.Event",
+) -> None:
+    """Entry point of a worker process; the resident model lives in its `inference` module.
+
+    With `device_id` set the worker is bound to that GPU; the host only queues
+    requests listing that device here, and each is run on it alone. With
+    `warmup_args` the model is loaded and run once before serving; `ready` is
+    set afterwards (also when warm-up fails, the error is printed).
+    """
+    if device_id is not None and torch.cuda.is_available():
+        torch.cuda.set_device(device_id)
+    if warmup_args is not None:
+        if device_id is not None:
+            warmup_args.device_ids = [device_id]
+        try:
+            inference.warmup(warmup_args)
+        except Exception:
+            traceback.print_exc()
+    ready.set()
+    while True:
+        batch = _next_batch(jobs, max_batch_size, timeout_ms)
+        if device_id is not None:
+            for _, args in batch:
+                args.device_ids = [device_id]
+        for group in _group(batch).values():
+            _run_group(events, group)
+
+
+class _Worker:
+    """Parent-side handle of one worker process: its job queue and the requests queued on it."""
+
+    def __init__(
+        self,
+        process: "mp.process.BaseProcess",
+        jobs: "mp.Queue[_Job]",
+        ready: "mp.synchronize.Event",
+        device_id: Optional[int],
+    ) -> None:
+        self.process = process
+        self.jobs = jobs
+        self.ready = ready
+        self.device_id = device_id
+        self.pending: Dict[int, _Deliver] = {}
+
+
+def _requested_devices(args: argparse.Namespace) -> List[int]:
+    device_ids = getattr(args, "device_ids", None)
+    if device_ids is None:
+        return []
+    return list(device_ids) if isinstance(device_ids, (list, tuple)) else [device_ids]
+
+
+def _finish(result: JobResult, outputs: Optional[List[str]]) -> None:
+    if not result.ok:
+        raise InferenceError("Inference failed, see the log above.")
+    if outputs is not None:
+        outputs.extend(result.outputs)
+
+
+class InferenceHost:
+    """Owns worker processes that keep the model resident and serve queued requests.
+
+    One worker is started per entry of `device_ids` (or a single unpinned worker
+    when it is empty), each holding its own copy of the model on its GPU and
+    reading its own job queue. A request is queued on the least busy worker
+    among the devices in its `device_ids`. Requests arriving at a worker within
+    `timeout_ms` of each other (up to `max_batch_size`) are drained together,
+    grouped by model, and each group is separated with one `inference.run_batch`
+    call so their chunks share forward batches. Log output is streamed back per
+    request; requests held by a worker that dies are failed, and the worker is
+    restarted on the next request.
+    """
+
+    def __init__(
+        self,
+        device_ids: Sequence[int] = (),
+        max_batch_size: int = 4,
+        timeout_ms: int = 50,
+    ) -> None:
+        self.device_ids: List[Optional[int]] = list(device_ids) or [None]
+        self.max_batch_size = max_batch_size
+        self.timeout_ms = timeout_ms
+        self._ctx = mp.get_context(_START_METHOD)
+        self._events: "mp.Queue[_Event] | None" = None
+        self._workers: Dict[Optional[int], _Worker] = {}
+        # job id -> worker holding it; guarded by _lock together with each worker's pending
+        self._owners: Dict[int, _Worker] = {}
+        self._lock = threading.Lock()
+        self._warmup_args: Optional[argparse.Namespace] = None
+        self._start_lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def serves(self, device_ids: Sequence[int]) -> bool:
+        """Whether some worker can run a request restricted to `device_ids` (empty: any)."""
+        return not device_ids or any(
+            device_id is None or device_id in device_ids for device_id in self.device_ids
+        )
+
+    def warm_up(self, args: argparse.Namespace, timeout: Optional[float] = None) -> bool:
+        """(Re)start the workers with a warm-up pass on `args` and wait until all are ready.
+
+        The warm-up is repeated whenever a worker is restarted. Returns False if
+        a worker exits before it is ready (it is restarted on the next request)
+        or `timeout` expires first.
+        """
+        with self._start_lock:
+            self._warmup_args = args
+            self._stop_workers()
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiting = list(self._workers.values())
+        while waiting:
+            if any(not worker.process.is_alive() for worker in waiting):
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            # Poll so a worker that dies during warm-up is noticed.
+            waiting[0].ready.wait(0.1)
+            waiting = [worker for worker in waiting if not worker.ready.is_set()]
+        return True
+
+    def start(self) -> None:
+        """Start the event router and any worker process that is not running."""
+        with self._start_lock:
+            if self._events is None:
+                if _START_METHOD == "forkserver":
+                    self._ctx.set_forkserver_preload(_PRELOAD)
+                self._events = self._ctx.Queue()
+                threading.Thread(
+                    target=self._route_events,
+                    args=(self._events,),
+                    name="inference-events",
+                    daemon=True,
+                ).start()
+            for device_id in self.device_ids:
+                worker = self._workers.get(device_id)
+                if worker is not None and worker.process.is_alive():
+                    continue
+                if worker is not None:
+                    self._fail(worker, self._exit_message(worker))
+                worker = self._start_worker(device_id)
+                with self._lock:
+                    self._workers[device_id] = worker
+
+    def _start_worker(self, device_id: Optional[int]) -> _Worker:
+        jobs = self._ctx.Queue()
+        ready = self._ctx.Event()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                jobs,
+                self._events,
+                self.max_batch_size,
+                self.timeout_ms,
+                device_id,
+                self._warmup_args,
+                ready,
+            ),
+            name=f"inference-worker-{device_id if device_id is not None else 'default'}",
+            daemon=True,
+        )
+        process.start()
+        return _Worker(process, jobs, ready, device_id)
+
+    async def astream(
+        self, args: argparse.Namespace, outputs: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        """Queue `args` for inference and yield its log chunks as they are printed.
+
+        On success the written stem files are appended to `outputs`; a failed
+        request raises `InferenceError` after its last chunk.
+        """
+        await asyncio.to_thread(self.start)
+        loop = asyncio.get_running_loop()
+        response: "asyncio.Queue[Union[str, JobResult]]" = asyncio.Queue()
+        self._enqueue(args, lambda chunk: loop.call_soon_threadsafe(response.put_nowait, chunk))
+        while True:
+            chunk = await response.get()
+            if isinstance(chunk, JobResult):
+                _finish(chunk, outputs)
+                return
+            yield chunk
+
+    def _enqueue(self, args: argparse.Namespace, deliver: _Deliver) -> None:
+        requested = _requested_devices(args)
+        job_id = next(self._ids)
+        with self._lock:
+            candidates = [
+                worker
+                for worker in self._workers.values()
+                if not requested or worker.device_id is None or worker.device_id in requested
+            ]
+            if candidates:
+                worker = min(candidates, key=lambda w: len(w.pending))
+                worker.pending[job_id] = deliver
+                self._owners[job_id] = worker
+        if not candidates:
+            deliver(f"No inference worker runs on device_ids {requested}.\n")
+            deliver(JobResult(False))
+            return
+        worker.jobs.put((job_id, args))
+
+    def _stop_workers(self) -> None:
+        for worker in self._workers.values():
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.process.join()
+            self._fail(worker, f"Inference worker {worker.process.name} was restarted.\n")
+        with self._lock:
+            self._workers = {}
+
+    @staticmethod
+    def _exit_message(worker: _Worker) -> str:
+        return f"Inference worker {worker.process.name} exited with code {worker.process.exitcode}.\n"
+
+    def _route_events(self, events: "mp.Queue[_Event]") -> None:
+        while True:
+            try:
+                job_id, chunk = events.get(timeout=0.5)
+            except queue.Empty:
+                pass
+            else:
+                with self._lock:
+                    worker = self._owners.get(job_id)
+                    deliver = worker.pending.get(job_id) if worker is not None else None
+                    if isinstance(chunk, JobResult) and worker is not None:
+                        worker.pending.pop(job_id, None)
+                        self._owners.pop(job_id, None)
+                if deliver is not None:
+                    deliver(chunk)
+            # Checked on every event too, so requests on a dead worker fail even
+            # while other workers keep the queue busy.
+            with self._lock:
+                dead = [
+                    worker
+                    for worker in self._workers.values()
+                    if worker.pending and not worker.process.is_alive()
+                ]
+            for worker in dead:
+                self._fail(worker, self._exit_message(worker))
+
+    def _fail(self, worker: _Worker, message: str) -> None:
+        """Fail the requests queued on `worker` (only those; other workers are unaffected)."""
+        with self._lock:
+            pending, worker.pending = worker.pending, {}
+            for job_id in pending:
+                self._owners.pop(job_id, None)
+        for deliver in pending.values():
+            deliver(message)
+            deliver(JobResult(False))
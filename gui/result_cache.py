@@ -0,0 +1,133 @@
+"""Content-addressed cache of separated stems, indexed in SQLite."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+CACHE_ROOT = Path.home() / ".cache" / "split_stems"
+DEFAULT_MAX_BYTES = 10 * 1024**3
+
+_READ_CHUNK = 1 << 20
+
+
+class ResultCache:
+    """Maps (input audio bytes, model, options) to a cached copy of its output folder.
+
+    Entries live in `root/<key>/` and are indexed in `root/cache.db` together
+    with the log of the run that produced them. When the entries exceed
+    `max_bytes`, the least recently used ones are evicted.
+    """
+
+    def __init__(self, root: Path = CACHE_ROOT, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = Path(root)
+        self.db_path = self.root / "cache.db"
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(self.db_path)) as conn, conn:
+            # ts is the time of the last store or hit
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, output_dir TEXT, log TEXT, ts REAL, size INTEGER)"
+            )
+
+    @staticmethod
+    def key(input_file: str, options: Dict[str, object]) -> str:
+        """Hash the input audio together with every option that affects the output.
+
+        Options naming files (config, checkpoint) also contribute their size and
+        mtime, so replacing a checkpoint in place invalidates old entries.
+        """
+        digest = hashlib.blake2b()
+        with open(input_file, "rb") as f:
+            for block in iter(lambda: f.read(_READ_CHUNK), b""):
+                digest.update(block)
+        items = []
+        for name, value in sorted(options.items()):
+            if isinstance(value, str) and os.path.isfile(value):
+                stat = os.stat(value)
+                value = (os.path.abspath(value), stat.st_size, stat.st_mtime_ns)
+            items.append((name, value))
+        digest.update(repr(items).encode())
+        return digest.hexdigest()
+
+    def lookup(self, key: str) -> Optional[Tuple[Path, str]]:
+        """Return (cached output dir, log) for `key`, or None on a miss."""
+        with closing(sqlite3.connect(self.db_path)) as conn, conn:
+            row = conn.execute(
+                "SELECT output_dir, log FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            output_dir = Path(row[0])
+            if not output_dir.is_dir():
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET ts = ? WHERE key = ?", (time.time(), key))
+        return output_dir, row[1]
+
+    def restore(self, key: str, target_dir: Path) -> Optional[str]:
+        """Copy the cached output for `key` into `target_dir`; return its log, or None on a miss."""
+        hit = self.lookup(key)
+        if hit is None:
+            return None
+        output_dir, log = hit
+        shutil.copytree(output_dir, target_dir, dirs_exist_ok=True)
+        return log
+
+    def store(self, key: str, produced_dir: Path, files: Sequence[str], log: str) -> bool:
+        """Cache `files`, the outputs of one successful run, under their paths relative to `produced_dir`.
+
+        Returns False, caching nothing, when there are no files or one lies
+        outside `produced_dir`. The files are copied into a private folder that
+        is then renamed into place, so concurrent stores of the same key (and
+        restores reading it) never see a half-written or deleted entry.
+        """
+        produced_dir = Path(produced_dir).resolve()
+        paths = [Path(f).resolve() for f in files]
+        if not paths or not all(p.is_file() and p.is_relative_to(produced_dir) for p in paths):
+            return False
+
+        output_dir = self.root / key
+        tmp_dir = self.root / f"{key}.{os.getpid()}.{threading.get_ident()}"
+        size = 0
+        try:
+            for path in paths:
+                dest = tmp_dir / path.relative_to(produced_dir)
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(path, dest)
+                size += dest.stat().st_size
+            try:
+                os.replace(tmp_dir, output_dir)
+            except OSError:
+                # Another store of the same key got there first; its files are the same.
+                if not output_dir.is_dir():
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        with closing(sqlite3.connect(self.db_path)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, output_dir, log, ts, size) VALUES (?, ?, ?, ?, ?)",
+                (key, str(output_dir), log, time.time(), size),
+            )
+            self._evict(conn)
+        return True
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Delete least recently used entries until the cache fits in `max_bytes`."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        rows = conn.execute("SELECT key, output_dir, size FROM results ORDER BY ts").fetchall()
+        for key, output_dir, size in rows:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(output_dir, ignore_errors=True)
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
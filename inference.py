@@ -1,10 +1,19 @@
 # coding: utf-8
 __author__ = "Roman Solovyev (ZFTurbo): https://github.com/ZFTurbo/"
 
+import argparse
+import contextlib
 import glob
+import json
 import os
 import sys
+import threading
 import time
+import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, ContextManager
 
 import librosa
 import numpy as np
@@ -23,6 +32,8 @@ from utils.audio_utils import denormalize_audio, draw_spectrogram, normalize_aud
 from utils.model_utils import (
     apply_tta,
     demix,
+    demix_many,
+    get_autocast,
     load_start_checkpoint,
     prefer_target_instrument,
 )
@@ -30,6 +41,20 @@ from utils.settings import get_model_from_config, parse_args_inference
 
 warnings.filterwarnings("ignore")
 
+# Resident model shared by repeated in-process calls to `run` (e.g. the Gradio
+# wrapper). `_MODEL_KEY` records what is loaded so a changed config/checkpoint
+# triggers a reload instead of silently reusing stale weights.
+_MODEL = None
+_CONFIG = None
+_DEVICE = None
+_MODEL_TYPE = None
+_MODEL_KEY = None
+_MODEL_LOCK = threading.Lock()
+
+# Stem files are encoded and written here so the model can move on to the next
+# track; callers wait for their writes before returning.
+_IO_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="stem-writer")
+
 
 def run_folder(
     model: "torch.nn.Module",
@@ -58,14 +83,7 @@ def run_folder(
     start_time = time.time()
     model.eval()
 
-    # direct use single file instead
-    if args.input_file:
-        mixture_paths = [os.path.abspath(args.input_file)]
-    # Recursively collect all files from input directory
-    # mixture_paths = sorted(
-    #     glob.glob(os.path.join(args.input_folder, "**/*.*"), recursive=True)
-    # )
-    # mixture_paths = [p for p in mixture_paths if os.path.isfile(p)]
+    mixture_paths = collect_mixture_paths(args)
 
     sample_rate: int = getattr(config.audio, "sample_rate", 44100)
 
@@ -86,96 +104,387 @@ def run_folder(
     else:
         detailed_pbar = True
 
+    writes: list[Future] = []
     for path in mixture_paths:
-        # Get relative path from input folder
-        relative_path: str = os.path.relpath(path, args.input_folder)
-        # Extract directory and file name
-        dir_name: str = os.path.dirname(relative_path)
-        file_name: str = os.path.splitext(os.path.basename(path))[0]
-
-        try:
-            mix, sr = librosa.load(path, sr=sample_rate, mono=False)
-        except Exception as e:
-            print(f"Cannot read track: {format(path)}")
-            print(f"Error message: {str(e)}")
+        track = read_mixture(path, config, sample_rate, shared_input(args, path))
+        if track is None:
             continue
-
-        # Convert mono audio to expected channel format if needed
-        if len(mix.shape) == 1:
-            mix = np.expand_dims(mix, axis=0)
-            if "num_channels" in config.audio:
-                if config.audio["num_channels"] == 2:
-                    print("Convert mono track to stereo...")
-                    mix = np.concatenate([mix, mix], axis=0)
-
-        mix_orig = mix.copy()
-
-        # Normalize input audio if enabled
-        if "normalize" in config.inference:
-            if config.inference["normalize"] is True:
-                mix, norm_params = normalize_audio(mix)
+        mix, mix_orig, norm_params, sr = track
 
         # Perform source separation
         waveforms_orig = demix(
-            config, model, mix, device, model_type=args.model_type, pbar=detailed_pbar
+            config,
+            model,
+            mix,
+            device,
+            model_type=args.model_type,
+            pbar=detailed_pbar,
+            precision=args.precision,
         )
 
         # Apply test-time augmentation if enabled
         if args.use_tta:
             waveforms_orig = apply_tta(
-                config, model, mix, waveforms_orig, device, args.model_type
+                config, model, mix, waveforms_orig, device, args.model_type, args.precision
             )
 
-        # Extract instrumental track if requested
-        if args.extract_instrumental:
-            instr = "vocals" if "vocals" in instruments else instruments[0]
-            waveforms_orig["instrumental"] = mix_orig - waveforms_orig[instr]
-            if "instrumental" not in instruments:
-                instruments.append("instrumental")
-
-        for instr in instruments:
-            estimates = waveforms_orig[instr]
-
-            # Denormalize output audio if normalization was applied
-            if "normalize" in config.inference:
-                if config.inference["normalize"] is True:
-                    estimates = denormalize_audio(estimates, norm_params)
-
-            peak: float = float(np.abs(estimates).max())
-            if peak <= 1.0 and args.pcm_type != "FLOAT":
-                codec = "flac"
-            else:
-                codec = "wav"
-
-            subtype = args.pcm_type
-
-            # Generate output directory structure using relative paths
-            dirnames, fname = format_filename(
-                args.filename_template,
-                instr=instr,
-                start_time=int(start_time),
-                file_name=file_name,
-                dir_name=dir_name,
-                model_type=args.model_type,
-                model=os.path.splitext(os.path.basename(args.start_check_point))[0],
-            )
+        writes += write_stems(
+            args, config, instruments, path, waveforms_orig, mix_orig, norm_params, sr, start_time
+        )
+
+    wait_writes(writes)
+    print(f"Elapsed time: {time.time() - start_time:.2f} seconds.")
+
 
-            # Create output directory
-            output_dir: str = os.path.join(args.store_dir, *dirnames)
-            os.makedirs(output_dir, exist_ok=True)
+def run_folder_batch(
+    model: "torch.nn.Module",
+    args_list: "list[argparse.Namespace]",
+    config: dict,
+    device: "torch.device",
+    on_done: "Callable[[int, bool, list[str]], None] | None" = None,
+    request_log: "Callable[[int], ContextManager] | None" = None,
+) -> None:
+    """
+    Process the inputs of several inference requests that share one model.
 
-            output_path: str = os.path.join(output_dir, f"{fname}.{codec}")
-            sf.write(output_path, estimates.T, sr, subtype=subtype)
+    Chunks of all tracks are stacked into shared forward batches via `demix_many`;
+    each request keeps its own output folder, TTA and instrumental settings.
+    Tracks are taken from the requests in turn, decoded only when `demix_many`
+    needs them and written as soon as they are separated, so memory stays
+    bounded and a short request batched with a long one finishes early.
 
-            # Draw and save spectrogram if enabled
-            if args.draw_spectro > 0:
-                output_img_path = os.path.join(output_dir, f"{fname}.jpg")
-                draw_spectrogram(estimates.T, sr, args.draw_spectro, output_img_path)
-                print("Wrote file:", output_img_path)
+    An error in one request's own work (its output folder, TTA, writing its
+    stems) fails only that request; the others keep being separated. Errors of
+    the shared forward pass propagate.
+
+    Parameters:
+    ----------
+    model : torch.nn.Module
+        Pre-trained model for source separation.
+    args_list : list[argparse.Namespace]
+        One argument namespace per request, all compatible with `model`.
+    config : dict
+        Configuration object with audio and inference settings.
+    device : torch.device
+        Device for model inference (CPU or CUDA).
+    on_done : Callable[[int, bool, list[str]], None], optional
+        Called once per request with its index into `args_list`, whether it
+        succeeded and the paths of the stem files written for it. Without it, a
+        failed request raises its error.
+    request_log : Callable[[int], ContextManager], optional
+        Returns a context within which printed output concerns only the request
+        with the given index, e.g. to route it to that caller alone.
+    """
+
+    start_time = time.time()
+    model.eval()
+    if request_log is None:
+        request_log = lambda index: contextlib.nullcontext()  # noqa: E731
+
+    sample_rate: int = getattr(config.audio, "sample_rate", 44100)
+
+    instruments = [prefer_target_instrument(config)[:] for _ in args_list]
+    writes: list[list[Future]] = [[] for _ in args_list]
+    reported = [False] * len(args_list)
+
+    def fail(index: int) -> None:
+        # Call from an `except` block, within `request_log(index)`.
+        if on_done is None:
+            raise
+        traceback.print_exc()
+        reported[index] = True
+        on_done(index, False, [])
+
+    paths_per_request = []
+    for index, args in enumerate(args_list):
+        with request_log(index):
+            try:
+                os.makedirs(args.store_dir, exist_ok=True)
+                paths_per_request.append(collect_mixture_paths(args))
+            except Exception:
+                paths_per_request.append([])
+                fail(index)
+    remaining = [len(paths) for paths in paths_per_request]
+
+    print(
+        f"Total files found: {sum(remaining)} in {len(args_list)} request(s). Using sample rate: {sample_rate}"
+    )
 
+    # Round-robin over the requests so none waits behind another's whole file list.
+    order = [
+        (index, paths[k])
+        for k in range(max(remaining, default=0))
+        for index, paths in enumerate(paths_per_request)
+        if k < len(paths)
+    ]
+    # (index, path, mix, mix_orig, norm_params, sr) of the tracks handed to demix_many
+    pending = deque()
+
+    def report(wait: bool = False) -> None:
+        for index in range(len(args_list)):
+            if reported[index] or remaining[index]:
+                continue
+            if not wait and not all(future.done() for future in writes[index]):
+                continue
+            with request_log(index):
+                try:
+                    outputs = wait_writes(writes[index])
+                except Exception:
+                    fail(index)
+                    continue
+                reported[index] = True
+                if on_done is not None:
+                    on_done(index, True, outputs)
+
+    def mixes():
+        for index, path in order:
+            if reported[index]:
+                # already failed, skip the rest of its tracks
+                continue
+            args = args_list[index]
+            with request_log(index):
+                track = read_mixture(path, config, sample_rate, shared_input(args, path))
+            if track is None:
+                remaining[index] -= 1
+                report()
+                continue
+            pending.append((index, path, *track))
+            yield track[0]
+
+    report()
+    model_type = args_list[0].model_type
+    for waveforms_orig in demix_many(
+        config,
+        model,
+        mixes(),
+        device,
+        model_type=model_type,
+        pbar=not args_list[0].disable_detailed_pbar,
+        precision=args_list[0].precision,
+    ):
+        index, path, mix, mix_orig, norm_params, sr = pending.popleft()
+        remaining[index] -= 1
+        if reported[index]:
+            continue
+        args = args_list[index]
+        with request_log(index):
+            try:
+                if args.use_tta:
+                    waveforms_orig = apply_tta(
+                        config, model, mix, waveforms_orig, device, model_type, args.precision
+                    )
+                writes[index] += write_stems(
+                    args, config, instruments[index], path, waveforms_orig, mix_orig, norm_params, sr, start_time
+                )
+            except Exception:
+                fail(index)
+        report()
+
+    report(wait=True)
     print(f"Elapsed time: {time.time() - start_time:.2f} seconds.")
 
 
+def collect_mixture_paths(args: "argparse.Namespace") -> list[str]:
+    """
+    Return the absolute paths of the mixtures selected by `args`.
+    """
+    # explicit list of files, e.g. one shard of a folder or a --manifest
+    if getattr(args, "input_files", None):
+        return [os.path.abspath(p) for p in args.input_files]
+    # direct use single file instead
+    if args.input_file:
+        return [os.path.abspath(args.input_file)]
+    if not args.input_folder:
+        return []
+    # Recursively collect all files from input directory
+    mixture_paths = sorted(
+        glob.glob(os.path.join(args.input_folder, "**/*.*"), recursive=True)
+    )
+    return [os.path.abspath(p) for p in mixture_paths if os.path.isfile(p)]
+
+
+def read_manifest(manifest_path: str) -> list[str]:
+    """
+    Read the input file list from a JSON manifest.
+
+    The manifest is either a list of paths or an object with an `input_files` list.
+    """
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = manifest.get("input_files", [])
+    if not isinstance(manifest, list) or not all(isinstance(p, str) for p in manifest):
+        raise ValueError(f"Manifest {manifest_path} must list input file paths")
+    return manifest
+
+
+def shared_input(args: "argparse.Namespace", path: str):
+    """
+    Return the shared-memory spec attached to `args` for `path`, if any.
+
+    In-process callers (the Gradio host) may decode the input file up front and
+    set `args.input_shm = {"path", "name", "shape", "dtype", "sr"}`.
+    """
+    spec = getattr(args, "input_shm", None)
+    if spec and spec["path"] == path:
+        return spec
+    return None
+
+
+def read_shared_audio(spec: dict, sample_rate: int) -> "tuple[np.ndarray, int]":
+    """
+    Copy decoded audio out of a shared-memory block and resample it if needed.
+
+    Returns the same (mix, sr) layout as `librosa.load(..., mono=False)`:
+    (channels, samples), or 1-D for mono.
+    """
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    try:
+        mix = np.ndarray(spec["shape"], dtype=spec["dtype"], buffer=shm.buf).copy()
+    finally:
+        shm.close()
+    if mix.shape[0] == 1:
+        mix = mix[0]
+    sr = spec["sr"]
+    if sr != sample_rate:
+        mix = librosa.resample(mix, orig_sr=sr, target_sr=sample_rate)
+        sr = sample_rate
+    return mix, sr
+
+
+def read_mixture(path: str, config: dict, sample_rate: int, shared: dict = None):
+    """
+    Load a mixture and prepare it for separation.
+
+    If `shared` (see `shared_input`) is given, the already decoded audio is
+    taken from shared memory instead of reading and decoding `path`; if that
+    block no longer exists, `path` is decoded after all.
+
+    Returns:
+        Tuple of (mix, mix_orig, norm_params, sr), or None if the file cannot be read.
+        `mix` is normalized when `config.inference.normalize` is enabled.
+    """
+    try:
+        if shared is not None:
+            try:
+                mix, sr = read_shared_audio(shared, sample_rate)
+            except FileNotFoundError:
+                # The caller already released the block (e.g. the request was cancelled).
+                shared = None
+        if shared is None:
+            mix, sr = librosa.load(path, sr=sample_rate, mono=False)
+    except Exception as e:
+        print(f"Cannot read track: {format(path)}")
+        print(f"Error message: {str(e)}")
+        return None
+
+    # Convert mono audio to expected channel format if needed
+    if len(mix.shape) == 1:
+        mix = np.expand_dims(mix, axis=0)
+        if "num_channels" in config.audio:
+            if config.audio["num_channels"] == 2:
+                print("Convert mono track to stereo...")
+                mix = np.concatenate([mix, mix], axis=0)
+
+    mix_orig = mix.copy()
+    norm_params = None
+
+    # Normalize input audio if enabled
+    if "normalize" in config.inference:
+        if config.inference["normalize"] is True:
+            mix, norm_params = normalize_audio(mix)
+
+    return mix, mix_orig, norm_params, sr
+
+
+def write_stems(
+    args: "argparse.Namespace",
+    config: dict,
+    instruments: list[str],
+    path: str,
+    waveforms_orig: dict,
+    mix_orig: np.ndarray,
+    norm_params,
+    sr: int,
+    start_time: float,
+) -> list[Future]:
+    """
+    Write the separated stems of one track to `args.store_dir`.
+
+    The audio files are written on `_IO_POOL`; returns their futures (resolving
+    to the written paths), to be passed to `wait_writes`. Appends "instrumental" to `instruments` when
+    `--extract_instrumental` is set.
+    """
+    writes: list[Future] = []
+    # Get relative path from input folder
+    relative_path: str = os.path.relpath(path, args.input_folder)
+    # Extract directory and file name
+    dir_name: str = os.path.dirname(relative_path)
+    file_name: str = os.path.splitext(os.path.basename(path))[0]
+
+    # Extract instrumental track if requested
+    if args.extract_instrumental:
+        instr = "vocals" if "vocals" in instruments else instruments[0]
+        waveforms_orig["instrumental"] = mix_orig - waveforms_orig[instr]
+        if "instrumental" not in instruments:
+            instruments.append("instrumental")
+
+    for instr in instruments:
+        estimates = waveforms_orig[instr]
+
+        # Denormalize output audio if normalization was applied
+        if norm_params is not None:
+            estimates = denormalize_audio(estimates, norm_params)
+
+        peak: float = float(np.abs(estimates).max())
+        if peak <= 1.0 and args.pcm_type != "FLOAT":
+            codec = "flac"
+        else:
+            codec = "wav"
+
+        subtype = args.pcm_type
+
+        # Generate output directory structure using relative paths
+        dirnames, fname = format_filename(
+            args.filename_template,
+            instr=instr,
+            start_time=int(start_time),
+            file_name=file_name,
+            dir_name=dir_name,
+            model_type=args.model_type,
+            model=os.path.splitext(os.path.basename(args.start_check_point))[0],
+        )
+
+        # Create output directory
+        output_dir: str = os.path.join(args.store_dir, *dirnames)
+        os.makedirs(output_dir, exist_ok=True)
+
+        output_path: str = os.path.join(output_dir, f"{fname}.{codec}")
+        writes.append(_IO_POOL.submit(_write_audio, output_path, estimates.T, sr, subtype))
+
+        # Draw and save spectrogram if enabled
+        if args.draw_spectro > 0:
+            output_img_path = os.path.join(output_dir, f"{fname}.jpg")
+            draw_spectrogram(estimates.T, sr, args.draw_spectro, output_img_path)
+            print("Wrote file:", output_img_path)
+
+    return writes
+
+
+def _write_audio(path: str, data: np.ndarray, sr: int, subtype: str) -> str:
+    sf.write(path, data, sr, subtype=subtype)
+    return path
+
+
+def wait_writes(writes: list[Future]) -> list[str]:
+    """
+    Block until the stem writes returned by `write_stems` are done, re-raising the first error.
+
+    Returns the paths of the written files.
+    """
+    return [future.result() for future in writes]
+
+
 def format_filename(template, **kwargs):
     """
     Formats a filename from a template. e.g "{file_name}/{instr}"
@@ -189,8 +498,10 @@ def format_filename(template, **kwargs):
     return dirnames, fname
 
 
-def proc_folder(dict_args):
-    args = parse_args_inference(dict_args)
+def get_device(args: "argparse.Namespace") -> str:
+    """
+    Pick the inference device from `--force_cpu` / `--device_ids` and what is available.
+    """
     device = "cpu"
     if args.force_cpu:
         device = "cpu"
@@ -203,13 +514,75 @@ def proc_folder(dict_args):
         )
     elif torch.backends.mps.is_available():
         device = "mps"
+    return device
 
+
+def _load_key(args: "argparse.Namespace") -> tuple:
+    """
+    Identify the model (and placement) requested by `args`; equal keys share the resident model.
+    """
+    device_ids = (
+        tuple(args.device_ids)
+        if isinstance(args.device_ids, list)
+        else (args.device_ids,)
+    )
+    return (
+        args.model_type,
+        os.path.abspath(args.config_path),
+        os.path.abspath(args.start_check_point) if args.start_check_point else "",
+        args.lora_checkpoint_loralib,
+        args.force_cpu,
+        device_ids,
+        getattr(args, "attn_impl", "config"),
+        getattr(args, "jit_trace", False),
+        # a trace bakes in the autocast dtype
+        args.precision if getattr(args, "jit_trace", False) else None,
+    )
+
+
+def model_key(args: "argparse.Namespace") -> tuple:
+    """
+    Identify requests that can share the resident model and one batched pass.
+    """
+    return _load_key(args) + (args.precision,)
+
+
+def load_model(args: "argparse.Namespace"):
+    """
+    Load the model described by `args`, reusing the resident one when possible.
+
+    The model, config and device are kept in module-level globals, so repeated
+    calls with the same model type, config, checkpoint and device skip model
+    construction and `torch.load`. Not thread-safe on its own; `run` calls it
+    while holding `_MODEL_LOCK`.
+
+    Returns:
+        Tuple of (model, config, device). `args.model_type` is updated in place
+        if the config overrides it.
+    """
+    global _MODEL, _CONFIG, _DEVICE, _MODEL_TYPE, _MODEL_KEY
+
+    device = get_device(args)
     print("Using device: ", device)
 
+    key = _load_key(args)
+    if _MODEL is not None and key == _MODEL_KEY:
+        print("Reusing resident model.")
+        args.model_type = _MODEL_TYPE
+        return _MODEL, _CONFIG, _DEVICE
+
+    # Drop the previous model before building the new one so only one set of
+    # weights is resident on the device at a time.
+    _MODEL = _CONFIG = _DEVICE = _MODEL_TYPE = _MODEL_KEY = None
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
     model_load_start_time = time.time()
     torch.backends.cudnn.benchmark = True
 
-    model, config = get_model_from_config(args.model_type, args.config_path)
+    model, config = get_model_from_config(
+        args.model_type, args.config_path, getattr(args, "attn_impl", "config")
+    )
     if "model_type" in config.training:
         args.model_type = config.training.model_type
     if args.start_check_point:
@@ -230,9 +603,190 @@ def proc_folder(dict_args):
 
     model = model.to(device)
 
+    if getattr(args, "jit_trace", False):
+        model = trace_model(model, args, config, device)
+
     print("Model load time: {:.2f} sec".format(time.time() - model_load_start_time))
 
-    run_folder(model, args, config, device, verbose=True)
+    _MODEL, _CONFIG, _DEVICE, _MODEL_TYPE, _MODEL_KEY = (
+        model,
+        config,
+        device,
+        args.model_type,
+        key,
+    )
+    return model, config, device
+
+
+class TracedSeparator(nn.Module):
+    """
+    Runs a TorchScript trace recorded for a fixed batch size on any batch size.
+
+    Short batches (e.g. the last one of a track) are zero-padded up to
+    `batch_size` and long ones are split, since the trace is shape-specialized.
+    """
+
+    def __init__(self, traced: "torch.jit.ScriptModule", batch_size: int) -> None:
+        super().__init__()
+        self.traced = traced
+        self.batch_size = batch_size
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        outputs = []
+        for part in torch.split(x, self.batch_size):
+            n = part.shape[0]
+            if n < self.batch_size:
+                pad = part.new_zeros((self.batch_size - n,) + tuple(part.shape[1:]))
+                part = torch.cat([part, pad])
+            outputs.append(self.traced(part)[:n])
+        return torch.cat(outputs)
+
+
+def trace_model(
+    model: "torch.nn.Module",
+    args: "argparse.Namespace",
+    config: dict,
+    device: str,
+) -> "torch.nn.Module":
+    """
+    Replace `model` with a TorchScript trace specialized to the inference chunk shape.
+
+    The trace is stored next to the checkpoint as
+    `<checkpoint>.<device>.b<batch size>.<precision>.<attn_impl>.traced.pt` and reused
+    while it is newer than the checkpoint and config. The device includes the
+    GPU index (e.g. `cuda1`), since tracing records the device of tensors the
+    model creates in `forward`. Models that cannot be traced (or are not chunked
+    the generic way) are returned unchanged.
+    """
+    if args.model_type == "htdemucs" or isinstance(model, nn.DataParallel):
+        print("TorchScript trace is not supported for this setup, using eager mode.")
+        return model
+
+    if "chunk_size" in config.inference:
+        chunk_size = config.inference.chunk_size
+    else:
+        chunk_size = config.audio.chunk_size
+    num_channels = config.audio.get("num_channels", 2)
+    batch_size = config.inference.batch_size
+    torch_device = torch.device(device)
+    device_tag = torch_device.type
+    if torch_device.type == "cuda":
+        index = torch_device.index if torch_device.index is not None else torch.cuda.current_device()
+        device_tag = f"cuda{index}"
+    attn_impl = getattr(args, "attn_impl", "config")
+
+    base = os.path.splitext(args.start_check_point or args.config_path)[0]
+    traced_path = f"{base}.{device_tag}.b{batch_size}.{args.precision}.{attn_impl}.traced.pt"
+    sources = [p for p in (args.start_check_point, args.config_path) if p]
+
+    model.eval()
+    try:
+        if os.path.isfile(traced_path) and all(
+            os.path.getmtime(traced_path) >= os.path.getmtime(p) for p in sources
+        ):
+            traced = torch.jit.load(traced_path, map_location=device)
+            print(f"Loaded TorchScript trace: {traced_path}")
+        else:
+            example = torch.zeros(batch_size, num_channels, chunk_size, device=device)
+            with get_autocast(config, device, args.precision), torch.no_grad():
+                traced = torch.jit.trace(model, example, check_trace=False)
+            save_trace(traced, traced_path)
+    except Exception as e:
+        print(f"TorchScript trace failed, using eager mode. Error message: {str(e)}")
+        return model
+
+    return TracedSeparator(traced, batch_size)
+
+
+def save_trace(traced: "torch.jit.ScriptModule", traced_path: str) -> None:
+    """
+    Save a trace atomically; on failure only report it, the trace is still usable in memory.
+
+    Workers tracing the same model concurrently each write a private temporary
+    file and move it into place, so a reader never sees a partial file.
+    """
+    tmp_path = f"{traced_path}.{os.getpid()}.tmp"
+    try:
+        traced.save(tmp_path)
+        os.replace(tmp_path, traced_path)
+        print(f"Saved TorchScript trace: {traced_path}")
+    except Exception as e:
+        print(f"Cannot save TorchScript trace, using it without saving. Error message: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def warmup(args: "argparse.Namespace") -> None:
+    """
+    Load the resident model for `args` and run one dummy forward pass.
+
+    Pays model loading, CUDA context creation and cuDNN algorithm selection
+    up front so the first real request does not.
+    """
+    with _MODEL_LOCK:
+        start_time = time.time()
+        model, config, device = load_model(args)
+        model.eval()
+        if args.model_type == "htdemucs":
+            chunk_size = config.training.samplerate * config.training.segment
+        elif "chunk_size" in config.inference:
+            chunk_size = config.inference.chunk_size
+        else:
+            chunk_size = config.audio.chunk_size
+        num_channels = config.audio.get("num_channels", 2)
+        example = torch.zeros(
+            config.inference.batch_size, num_channels, chunk_size, device=device
+        )
+        with get_autocast(config, device, args.precision), torch.inference_mode():
+            model(example)
+        if torch.cuda.is_available() and str(device).startswith("cuda"):
+            torch.cuda.synchronize(device)
+        print(f"Warm-up done on {device} in {time.time() - start_time:.2f} sec.")
+
+
+def run(args: "argparse.Namespace") -> None:
+    """
+    Separate the input(s) described by `args` using the resident model.
+
+    Intended for long-lived callers that invoke inference many times in one
+    process; the model is loaded on the first call and reused afterwards.
+    Calls are serialized with `_MODEL_LOCK`.
+    """
+    with _MODEL_LOCK:
+        model, config, device = load_model(args)
+        if getattr(args, "input_files", None):
+            # List of files: stack chunks of all of them into shared forward batches.
+            run_folder_batch(model, [args], config, device)
+        else:
+            run_folder(model, args, config, device, verbose=True)
+
+
+def run_batch(
+    args_list: "list[argparse.Namespace]",
+    on_done: "Callable[[int, bool, list[str]], None] | None" = None,
+    request_log: "Callable[[int], ContextManager] | None" = None,
+) -> None:
+    """
+    Separate the inputs of several compatible requests in one pass.
+
+    All namespaces must describe the same model (see `model_key`); the model is
+    loaded once from the first one and chunks of every track share forward batches.
+    `on_done(index, ok, outputs)` is called as each request finishes and
+    `request_log` scopes output to one request, see `run_folder_batch`.
+    Requests not reported when this raises have failed.
+    """
+    with _MODEL_LOCK:
+        model, config, device = load_model(args_list[0])
+        for args in args_list[1:]:
+            args.model_type = args_list[0].model_type
+        run_folder_batch(model, args_list, config, device, on_done, request_log)
+
+
+def proc_folder(dict_args):
+    args = parse_args_inference(dict_args)
+    if getattr(args, "manifest", None):
+        args.input_files = read_manifest(args.manifest)
+    run(args)
 
 
 if __name__ == "__main__":
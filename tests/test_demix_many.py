@@ -0,0 +1,76 @@
+import os
+import sys
+
+import numpy as np
+import torch
+import torch.nn as nn
+from ml_collections import ConfigDict
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.model_utils import demix, demix_many
+
+INSTRUMENTS = ['vocals', 'other']
+
+
+class ConvSeparator(nn.Module):
+    """Tiny deterministic model whose output depends on neighbouring samples."""
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.conv = nn.Conv1d(2, 2 * len(INSTRUMENTS), kernel_size=9, padding=4)
+
+    def forward(self, x):
+        y = self.conv(x)
+        return y.view(x.shape[0], len(INSTRUMENTS), x.shape[1], x.shape[2])
+
+
+def make_config(batch_size):
+    return ConfigDict({
+        'audio': {'chunk_size': 1024, 'num_channels': 2, 'sample_rate': 44100},
+        'inference': {'batch_size': batch_size, 'num_overlap': 2},
+        'training': {'instruments': INSTRUMENTS, 'target_instrument': None, 'use_amp': False},
+    })
+
+
+def make_mix(length, seed):
+    return np.random.RandomState(seed).uniform(-1, 1, (2, length)).astype(np.float32)
+
+
+def test_single_track_matches_demix():
+    config = make_config(batch_size=1)
+    model = ConvSeparator().eval()
+    mix = make_mix(10_000, seed=1)
+
+    expected = demix(config, model, mix, 'cpu', model_type='bs_roformer', precision='fp32')
+    (result,) = list(demix_many(config, model, [mix], 'cpu', model_type='bs_roformer', precision='fp32'))
+
+    for instr in INSTRUMENTS:
+        np.testing.assert_allclose(result[instr], expected[instr], rtol=1e-5, atol=1e-5)
+
+
+def test_tracks_are_pulled_lazily_and_yielded_in_order():
+    config = make_config(batch_size=4)
+    model = ConvSeparator().eval()
+    mixes = [make_mix(length, seed) for seed, length in enumerate([3_000, 700, 9_000, 5_000])]
+    pulled = []
+
+    def lazy_mixes():
+        for index, mix in enumerate(mixes):
+            pulled.append(index)
+            yield mix
+
+    results = []
+    for result in demix_many(config, model, lazy_mixes(), 'cpu', model_type='bs_roformer',
+                             precision='fp32', max_tracks=2):
+        # Only tracks up to two ahead of the ones already yielded may have been decoded.
+        assert len(pulled) <= len(results) + 2
+        results.append(result)
+
+    assert len(results) == len(mixes)
+    for mix, result in zip(mixes, results):
+        (alone,) = list(demix_many(config, model, [mix], 'cpu', model_type='bs_roformer', precision='fp32'))
+        for instr in INSTRUMENTS:
+            assert result[instr].shape == mix.shape
+            np.testing.assert_allclose(result[instr], alone[instr], rtol=1e-5, atol=1e-5)
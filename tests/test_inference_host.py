@@ -0,0 +1,91 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gui.inference_host import InferenceHost, JobResult, _Worker
+
+
+class FakeProcess:
+    """Stands in for a worker process; only liveness is needed by the host."""
+
+    def __init__(self, name):
+        self.name = name
+        self.alive = True
+        self.exitcode = None
+
+    def is_alive(self):
+        return self.alive
+
+
+def make_host(device_ids):
+    host = InferenceHost(device_ids=device_ids)
+    host._workers = {
+        device_id: _Worker(FakeProcess(f'worker-{device_id}'), queue.Queue(), threading.Event(), device_id)
+        for device_id in device_ids
+    }
+    return host
+
+
+def enqueue(host, device_ids):
+    delivered = []
+    host._enqueue(argparse.Namespace(device_ids=device_ids), delivered.append)
+    return delivered
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_requests_go_to_the_least_busy_requested_worker():
+    host = make_host([0, 1, 2])
+
+    def pending():
+        return [len(host._workers[device_id].pending) for device_id in (0, 1, 2)]
+
+    enqueue(host, [2])
+    enqueue(host, [2])
+    assert pending() == [0, 0, 2]
+    enqueue(host, [])
+    enqueue(host, [])
+    assert pending() == [1, 1, 2]
+    enqueue(host, [1, 2])
+    assert pending() == [1, 2, 2]
+    assert [host._workers[device_id].jobs.qsize() for device_id in (0, 1, 2)] == [1, 2, 2]
+
+
+def test_request_for_unserved_device_fails_at_once():
+    host = make_host([0])
+    delivered = enqueue(host, [3])
+
+    assert not host.serves([3])
+    assert delivered[-1] == JobResult(False)
+    assert not host._workers[0].pending
+
+
+def test_dead_worker_fails_only_its_own_requests():
+    host = make_host([0, 1])
+    events = queue.Queue()
+    on_dead = enqueue(host, [0])
+    on_alive = enqueue(host, [1])
+    threading.Thread(target=host._route_events, args=(events,), daemon=True).start()
+
+    host._workers[0].process.alive = False
+    host._workers[0].process.exitcode = -9
+    wait_for(lambda: on_dead and on_dead[-1] == JobResult(False))
+
+    assert 'exited with code -9' in on_dead[0]
+    assert on_alive == []
+    (job_id,) = host._workers[1].pending
+    events.put((job_id, 'log line\n'))
+    events.put((job_id, JobResult(True, ('stem.wav',))))
+    wait_for(lambda: len(on_alive) == 2)
+    assert on_alive == ['log line\n', JobResult(True, ('stem.wav',))]
+    assert not host._workers[1].pending
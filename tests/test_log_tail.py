@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip('gradio')
+
+from gui.gradio_cli_wrapper import _LOG_TAIL_CHARS, _LogTail
+
+
+def test_redraws_collapse_to_the_last_frame():
+    log = _LogTail()
+    log.append('start\n 10%|#')
+    log.append('\r 50%|#####')
+    assert str(log) == 'start\n 50%|#####'
+
+    # A trailing "\r" can be followed by the "\n" of the next chunk.
+    log.append('\r100%|##########|\r')
+    log.append('\ndone\n')
+    assert str(log) == 'start\n100%|##########|\ndone\n'
+
+
+def test_only_the_tail_is_kept():
+    log = _LogTail()
+    for i in range(10_000):
+        log.append(f'line {i}\n')
+
+    text = str(log)
+    assert len(text) == _LOG_TAIL_CHARS
+    assert text.endswith('line 9999\n')
+    assert len(log._done) <= 2 * _LOG_TAIL_CHARS
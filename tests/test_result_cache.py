@@ -0,0 +1,72 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gui.result_cache import ResultCache
+
+
+def make_output(tmp_path, name, size):
+    produced = tmp_path / 'out' / name
+    produced.mkdir(parents=True)
+    files = []
+    for instr in ('vocals', 'other'):
+        path = produced / f'{instr}.wav'
+        path.write_bytes(b'x' * size)
+        files.append(str(path))
+    return produced, files
+
+
+def test_key_depends_on_audio_options_and_checkpoint(tmp_path):
+    song = tmp_path / 'song.wav'
+    song.write_bytes(b'audio')
+    checkpoint = tmp_path / 'model.ckpt'
+    checkpoint.write_bytes(b'weights')
+    options = {'start_check_point': str(checkpoint), 'use_tta': False}
+    key = ResultCache.key(str(song), options)
+
+    assert ResultCache.key(str(song), dict(options)) == key
+    assert ResultCache.key(str(song), {**options, 'use_tta': True}) != key
+    song.write_bytes(b'other audio')
+    assert ResultCache.key(str(song), options) != key
+    song.write_bytes(b'audio')
+    checkpoint.write_bytes(b'new weights')
+    assert ResultCache.key(str(song), options) != key
+
+
+def test_store_and_restore(tmp_path):
+    cache = ResultCache(tmp_path / 'cache')
+    produced, files = make_output(tmp_path, 'song', 10)
+
+    assert cache.store('k', produced, files, 'the log')
+    assert cache.restore('k', tmp_path / 'restored') == 'the log'
+    assert sorted(os.listdir(tmp_path / 'restored')) == ['other.wav', 'vocals.wav']
+    assert cache.restore('missing', tmp_path / 'restored') is None
+
+
+def test_store_rejects_files_outside_the_produced_folder(tmp_path):
+    cache = ResultCache(tmp_path / 'cache')
+    produced, files = make_output(tmp_path, 'song', 10)
+    stray = tmp_path / 'stray.wav'
+    stray.write_bytes(b'x')
+
+    assert not cache.store('k', produced, files + [str(stray)], 'log')
+    assert not cache.store('k', produced, [], 'log')
+    assert cache.lookup('k') is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(tmp_path / 'cache', max_bytes=50)
+    for name in ('a', 'b'):
+        produced, files = make_output(tmp_path, name, 10)
+        assert cache.store(name, produced, files, name)
+    # A hit makes 'a' the most recently used entry.
+    assert cache.lookup('a') is not None
+
+    produced, files = make_output(tmp_path, 'c', 10)
+    assert cache.store('c', produced, files, 'c')
+
+    assert cache.lookup('b') is None
+    assert not (tmp_path / 'cache' / 'b').exists()
+    assert cache.lookup('a') is not None
+    assert cache.lookup('c') is not None
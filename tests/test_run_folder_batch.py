@@ -0,0 +1,68 @@
+import contextlib
+import os
+import sys
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import inference
+from utils.settings import parse_args_inference
+
+from test_demix_many import ConvSeparator, make_config
+
+
+def make_args(input_file, store_dir):
+    return parse_args_inference({
+        'model_type': 'bs_roformer',
+        'input_files': [input_file],
+        'store_dir': store_dir,
+        'precision': 'fp32',
+        'disable_detailed_pbar': True,
+    })
+
+
+def test_failed_request_does_not_fail_the_others(tmp_path, capsys):
+    input_file = str(tmp_path / 'song.wav')
+    sf.write(input_file, np.random.RandomState(0).uniform(-0.5, 0.5, (5_000, 2)), 44100)
+    # An existing file where the output folder should go.
+    bad_store = tmp_path / 'taken'
+    bad_store.write_text('')
+    args_list = [make_args(input_file, str(bad_store)), make_args(input_file, str(tmp_path / 'out'))]
+
+    done = {}
+    logs = {0: [], 1: []}
+
+    @contextlib.contextmanager
+    def request_log(index):
+        yield
+        logs[index].append(capsys.readouterr().err)
+
+    inference.run_folder_batch(
+        ConvSeparator().eval(), args_list, make_config(batch_size=2), 'cpu',
+        on_done=lambda index, ok, outputs: done.__setitem__(index, (ok, outputs)),
+        request_log=request_log,
+    )
+
+    assert done[0] == (False, [])
+    ok, outputs = done[1]
+    assert ok
+    assert sorted(os.path.basename(path) for path in outputs) == ['other.wav', 'vocals.wav']
+    assert all(os.path.isfile(path) for path in outputs)
+    # The traceback is printed within the failed request's scope only.
+    assert 'FileExistsError' in ''.join(logs[0])
+    assert 'FileExistsError' not in ''.join(logs[1])
+
+
+def test_failed_request_raises_without_on_done(tmp_path):
+    input_file = str(tmp_path / 'song.wav')
+    sf.write(input_file, np.zeros((1_000, 2)), 44100)
+    bad_store = tmp_path / 'taken'
+    bad_store.write_text('')
+
+    with pytest.raises(FileExistsError):
+        inference.run_folder_batch(
+            ConvSeparator().eval(), [make_args(input_file, str(bad_store))], make_config(batch_size=2), 'cpu'
+        )
@@ -2,6 +2,7 @@
 __author__ = 'Roman Solovyev (ZFTurbo): https://github.com/ZFTurbo/'
 
 import argparse
+import contextlib
 import json
 import os
 from datetime import datetime
@@ -11,17 +12,91 @@ import torch.nn as nn
 from ml_collections import ConfigDict
 from torch.optim import Adam, AdamW, SGD, RAdam, RMSprop
 from tqdm.auto import tqdm
-from typing import Dict, List, Tuple, Any, Union, Optional
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Tuple, Any, Union, Optional
 import loralib as lora
 import torch.distributed as dist
 
+def get_autocast(config: ConfigDict, device: Union[torch.device, str], precision: str = 'config'):
+    """
+    Return the autocast context used around inference forward passes.
+
+    Args:
+        config (ConfigDict): Configuration; `training.use_amp` drives the 'config' mode.
+        device (Union[torch.device, str]): Device the model runs on.
+        precision (str, optional): 'config' keeps the historical behaviour (CUDA fp16
+            autocast when `use_amp` is set), 'fp32' disables autocast, 'fp16' / 'bf16'
+            autocast to that dtype on CUDA or CPU, 'auto' is bf16 on CUDA and fp32
+            elsewhere (CPU autocast is usually slower than fp32). bf16 falls back to
+            fp16 on GPUs without bf16 support. Defaults to 'config'.
+
+    Returns:
+        A context manager.
+    """
+    if precision in (None, 'config'):
+        return torch.cuda.amp.autocast(enabled=getattr(config.training, 'use_amp', True))
+    device_type = torch.device(device).type
+    if precision == 'auto':
+        precision = 'bf16' if device_type == 'cuda' else 'fp32'
+    if precision == 'fp32' or device_type not in ('cuda', 'cpu'):
+        return contextlib.nullcontext()
+    dtype = {'fp16': torch.float16, 'bf16': torch.bfloat16}[precision]
+    if device_type == 'cuda' and dtype is torch.bfloat16 and not torch.cuda.is_bf16_supported():
+        dtype = torch.float16
+    return torch.autocast(device_type=device_type, dtype=dtype)
+
+
+class _ChunkStager:
+    """
+    Copy stacked CPU chunk batches to the inference device.
+
+    On CUDA the batch is stacked into one of two reusable pinned buffers and
+    copied with `non_blocking=True` on a side stream, so staging the next batch
+    can overlap the forward pass of the current one. Elsewhere batches are
+    simply moved with `.to(device)`.
+    """
+
+    def __init__(self, device: Union[torch.device, str]) -> None:
+        self.device = torch.device(device)
+        self.cuda = self.device.type == 'cuda' and torch.cuda.is_available()
+        self.buffers: List[Optional[torch.Tensor]] = [None, None]
+        self.next = 0
+        self.stream = torch.cuda.Stream(device=self.device) if self.cuda else None
+
+    def stage(self, batch_data: List[torch.Tensor]) -> torch.Tensor:
+        """Start copying `batch_data` (chunks of equal shape) to the device."""
+        if not self.cuda:
+            return torch.stack(batch_data, dim=0).to(self.device)
+        shape = (len(batch_data),) + tuple(batch_data[0].shape)
+        buffer = self.buffers[self.next]
+        if buffer is None or buffer.shape[0] < shape[0] or buffer.shape[1:] != shape[1:]:
+            buffer = torch.empty(shape, dtype=torch.float32, pin_memory=True)
+            self.buffers[self.next] = buffer
+        # The buffer is reused two batches later; by then its copy has been
+        # waited on and the results of that batch read back, so it is idle.
+        self.next ^= 1
+        staging = buffer[:shape[0]]
+        torch.stack(batch_data, dim=0, out=staging)
+        with torch.cuda.stream(self.stream):
+            return staging.to(self.device, non_blocking=True)
+
+    def ready(self, batch: torch.Tensor) -> torch.Tensor:
+        """Make the current stream wait for the copy of `batch` before using it."""
+        if self.cuda:
+            current = torch.cuda.current_stream(self.device)
+            current.wait_stream(self.stream)
+            batch.record_stream(current)
+        return batch
+
+
 def demix(
     config: ConfigDict,
     model: torch.nn.Module,
     mix: torch.Tensor,
     device: torch.device,
     model_type: str,
-    pbar: bool = False
+    pbar: bool = False,
+    precision: str = 'config'
 ) -> Union[Dict[str, np.ndarray], np.ndarray]:
     """
     Perform audio source separation with a given model.
@@ -40,6 +115,8 @@ def demix(
             determines processing mode.
         pbar (bool, optional): If True, show a progress bar during chunk
             processing. Defaults to False.
+        precision (str, optional): Autocast mode, see `get_autocast`.
+            Defaults to 'config'.
 
     Returns:
         Union[Dict[str, np.ndarray], np.ndarray]:
@@ -82,9 +159,7 @@ def demix(
 
     batch_size = config.inference.batch_size
 
-    use_amp = getattr(config.training, 'use_amp', True)
-
-    with torch.cuda.amp.autocast(enabled=use_amp):
+    with get_autocast(config, device, precision):
         with torch.inference_mode():
             # Initialize result and counter tensors
             req_shape = (num_instruments,) + mix.shape
@@ -94,6 +169,7 @@ def demix(
             i = 0
             batch_data = []
             batch_locations = []
+            stager = _ChunkStager(device)
             if pbar and should_print:
                 progress_bar = tqdm(
                     total=mix.shape[1], desc="Processing audio chunks", leave=False
@@ -102,8 +178,8 @@ def demix(
                 progress_bar = None
 
             while i < mix.shape[1]:
-                # Extract chunk and apply padding if necessary
-                part = mix[:, i:i + chunk_size].to(device)
+                # Extract chunk and apply padding if necessary (on CPU, copied per batch)
+                part = mix[:, i:i + chunk_size]
                 chunk_len = part.shape[-1]
                 if mode == "generic" and chunk_len > chunk_size // 2:
                     pad_mode = "reflect"
@@ -117,7 +193,7 @@ def demix(
 
                 # Process batch if it's full or the end is reached
                 if len(batch_data) >= batch_size or i >= mix.shape[1]:
-                    arr = torch.stack(batch_data, dim=0)
+                    arr = stager.ready(stager.stage(batch_data))
                     x = model(arr)
 
                     if mode == "generic":
@@ -168,6 +244,163 @@ def demix(
         return ret_data
 
 
+class _Track:
+    """
+    One mixture in flight in `demix_many`: the padded input and its accumulated output.
+    """
+
+    def __init__(self, mix: np.ndarray, border: int, step: int, num_instruments: int) -> None:
+        mix = torch.tensor(mix, dtype=torch.float32)
+        self.padded = mix.shape[-1] > 2 * border and border > 0
+        if self.padded:
+            mix = nn.functional.pad(mix, (border, border), mode="reflect")
+        self.mix = mix
+        self.result = torch.zeros((num_instruments,) + mix.shape, dtype=torch.float32)
+        # The window weights are the same for every instrument and channel.
+        self.counter = torch.zeros(mix.shape[-1], dtype=torch.float32)
+        self.starts = range(0, mix.shape[-1], step)
+        self.remaining = len(self.starts)
+
+    def finish(self, instruments: List[str], border: int) -> Dict[str, np.ndarray]:
+        estimated_sources = (self.result / self.counter).numpy()
+        np.nan_to_num(estimated_sources, copy=False, nan=0.0)
+        if self.padded:
+            estimated_sources = estimated_sources[..., border:-border]
+        return {k: v for k, v in zip(instruments, estimated_sources)}
+
+
+def demix_many(
+    config: ConfigDict,
+    model: torch.nn.Module,
+    mixes: Iterable[np.ndarray],
+    device: torch.device,
+    model_type: str,
+    pbar: bool = False,
+    precision: str = 'config',
+    max_tracks: int = 4
+) -> Iterator[Union[Dict[str, np.ndarray], np.ndarray]]:
+    """
+    Separate a stream of mixtures, stacking chunks from several of them into shared batches.
+
+    Uses the same overlapping chunking, padding and windowing as `demix`, but the
+    chunk batches are filled across tracks instead of per track, so short tracks
+    (or many concurrent requests) still produce full `inference.batch_size` batches.
+    Mixtures are taken from `mixes` only when the next batch needs more chunks and
+    at most `max_tracks` are held at once; each result is yielded as soon as the
+    last chunk of its track is done. The Demucs mode has its own segment handling
+    and falls back to `demix` per track.
+
+    Args:
+        config (ConfigDict): Configuration object with audio and inference parameters.
+        model (torch.nn.Module): Source separation model for inference.
+        mixes (Iterable[np.ndarray]): Input mixtures, each of shape (channels, time).
+            May be a generator that decodes each track when it is requested.
+        device (torch.device): Device on which to run inference (CPU or CUDA).
+        model_type (str): Type of model; 'htdemucs' falls back to `demix`.
+        pbar (bool, optional): If True, show a progress bar over all chunks.
+            Defaults to False.
+        precision (str, optional): Autocast mode, see `get_autocast`.
+            Defaults to 'config'.
+        max_tracks (int, optional): Maximum number of tracks taken from `mixes`
+            and not yet yielded. Defaults to 4.
+
+    Yields:
+        Union[Dict[str, np.ndarray], np.ndarray]: One `demix`-style result per
+        input mixture, in input order.
+    """
+
+    if model_type == 'htdemucs':
+        for mix in mixes:
+            yield demix(config, model, mix, device, model_type=model_type, pbar=pbar, precision=precision)
+        return
+
+    should_print = not dist.is_initialized() or dist.get_rank() == 0
+
+    if 'chunk_size' in config.inference:
+        chunk_size = config.inference.chunk_size
+    else:
+        chunk_size = config.audio.chunk_size
+    instruments = prefer_target_instrument(config)
+    num_instruments = len(instruments)
+    num_overlap = config.inference.num_overlap
+
+    fade_size = chunk_size // 10
+    step = chunk_size // num_overlap
+    border = chunk_size - step
+    windowing_array = _getWindowingArray(chunk_size, fade_size)
+    batch_size = config.inference.batch_size
+
+    mixes = iter(mixes)
+    exhausted = False
+    tracks: Deque[_Track] = deque()  # taken from `mixes` and not yet yielded, in input order
+    queue: Deque[Tuple[_Track, int]] = deque()  # (track, chunk start) not yet staged
+    stager = _ChunkStager(device)
+
+    def stage() -> Optional[Tuple[List[Tuple[_Track, int]], torch.Tensor]]:
+        nonlocal exhausted
+        while not exhausted and len(queue) < batch_size and len(tracks) < max_tracks:
+            mix = next(mixes, None)
+            if mix is None:
+                exhausted = True
+                break
+            track = _Track(mix, border, step, num_instruments)
+            tracks.append(track)
+            queue.extend((track, i) for i in track.starts)
+        if not queue:
+            return None
+        batch_chunks = [queue.popleft() for _ in range(min(batch_size, len(queue)))]
+        batch_data = []
+        for track, i in batch_chunks:
+            part = track.mix[:, i:i + chunk_size]
+            chunk_len = part.shape[-1]
+            pad_mode = "reflect" if chunk_len > chunk_size // 2 else "constant"
+            part = nn.functional.pad(part, (0, chunk_size - chunk_len), mode=pad_mode, value=0)
+            batch_data.append(part)
+        return batch_chunks, stager.stage(batch_data)
+
+    if pbar and should_print:
+        progress_bar = tqdm(desc="Processing audio chunks", unit="chunk", leave=False)
+    else:
+        progress_bar = None
+
+    next_batch = stage()
+    while True:
+        # Hand out finished tracks (in input order) so their buffers can be freed.
+        while tracks and tracks[0].remaining == 0:
+            yield tracks.popleft().finish(instruments, border)
+        if next_batch is None:
+            # Staging may have been held back by `max_tracks` until tracks were yielded.
+            next_batch = stage()
+            if next_batch is None:
+                break
+            continue
+
+        batch_chunks, batch = next_batch
+        with torch.inference_mode():
+            batch = stager.ready(batch)
+            # Queue the copy of the next batch before running this one.
+            next_batch = stage()
+            with get_autocast(config, device, precision):
+                x = model(batch)
+
+            for j, (track, i) in enumerate(batch_chunks):
+                seg_len = min(chunk_size, track.mix.shape[1] - i)
+                window = windowing_array.clone()
+                if i == 0:  # First audio chunk of the track, no fadein
+                    window[:fade_size] = 1
+                if i + step >= track.mix.shape[1]:  # Last audio chunk of the track, no fadeout
+                    window[-fade_size:] = 1
+                track.result[..., i:i + seg_len] += x[j, ..., :seg_len].cpu() * window[:seg_len]
+                track.counter[i:i + seg_len] += window[:seg_len]
+                track.remaining -= 1
+
+        if progress_bar is not None:
+            progress_bar.update(len(batch_chunks))
+
+    if progress_bar is not None:
+        progress_bar.close()
+
+
 def initialize_model_and_device(model: torch.nn.Module, device_ids: List[int]) ->\
         Tuple[Union[torch.device, str], torch.nn.Module]:
     """
@@ -335,7 +568,8 @@ def apply_tta(
     mix: torch.Tensor,
     waveforms_orig: Union[dict[str, np.ndarray], np.ndarray],
     device: torch.device,
-    model_type: str
+    model_type: str,
+    precision: str = 'config'
 ) -> Union[dict[str, np.ndarray], np.ndarray]:
     """
     Enhance source separation results using Test-Time Augmentation (TTA).
@@ -352,6 +586,8 @@ def apply_tta(
             sources before augmentation.
         device (torch.device): Computation device (CPU or CUDA).
         model_type (str): Model type identifier used for demixing.
+        precision (str, optional): Autocast mode, see `get_autocast`.
+            Defaults to 'config'.
 
     Returns:
         Dict[str, torch.Tensor]: Dictionary of separated sources after applying TTA.
@@ -362,7 +598,7 @@ def apply_tta(
 
     # Process each augmented mixture
     for i, augmented_mix in enumerate(track_proc_list):
-        waveforms = demix(config, model, augmented_mix, device, model_type=model_type)
+        waveforms = demix(config, model, augmented_mix, device, model_type=model_type, precision=precision)
         for el in waveforms:
             if i == 0:
                 waveforms_orig[el] += waveforms[el][::-1].copy()
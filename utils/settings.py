@@ -199,6 +199,11 @@ def parse_args_inference(dict_args: Union[Dict, None]) -> argparse.Namespace:
     parser.add_argument("--start_check_point", type=str, default='', help="Initial checkpoint to valid weights")
     parser.add_argument("--input_folder", type=str, help="folder with mixtures to process")
     parser.add_argument("--input_file", type=str, help="single input file to process")
+    parser.add_argument("--input_files", nargs='+', type=str, default=None,
+                        help="list of input files to process; output subfolders stay relative to --input_folder if given")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="JSON file listing the input files to process (a list of paths, or an object with an"
+                             " 'input_files' list); read into --input_files")
     parser.add_argument("--store_dir", type=str, default="", help="path to store results as wav file")
     parser.add_argument("--draw_spectro", type=float, default=0,
                         help="Code will generate spectrograms for resulted stems."
@@ -218,6 +223,17 @@ def parse_args_inference(dict_args: Union[Dict, None]) -> argparse.Namespace:
     parser.add_argument("--filename_template", type=str, default='{file_name}/{instr}',
                         help="Output filename template, without extension, using '/' for subdirectories. Default: '{file_name}/{instr}'")
     parser.add_argument("--lora_checkpoint_loralib", type=str, default='', help="Initial checkpoint to LoRA weights")
+    parser.add_argument("--precision", type=str, choices=['config', 'auto', 'fp32', 'fp16', 'bf16'], default='config',
+                        help="Autocast precision for inference. 'config' keeps fp16 autocast on CUDA when"
+                             " training.use_amp is set; 'auto' uses bf16 on CUDA and fp32 elsewhere;"
+                             " bf16 falls back to fp16 on GPUs without bf16 support.")
+    parser.add_argument("--attn_impl", type=str, choices=['config', 'flash', 'eager'], default='config',
+                        help="Attention implementation for models with a flash_attn option (RoFormer family)."
+                             " 'flash' uses fused scaled_dot_product_attention, 'eager' the plain einsum path,"
+                             " 'config' keeps the value from the config file.")
+    parser.add_argument("--jit_trace", action='store_true',
+                        help="Run a TorchScript trace of the model. The trace is saved next to the checkpoint"
+                             " and reused on later runs; falls back to eager mode if tracing fails.")
     if dict_args is not None:
         args = parser.parse_args([])
         args_dict = vars(args)
@@ -272,7 +288,27 @@ def load_config(model_type: str, config_path: str) -> Union[ConfigDict, OmegaCon
         raise ValueError(f"Error loading configuration: {e}")
 
 
-def get_model_from_config(model_type: str, config_path: str) -> Tuple[nn.Module, Union[ConfigDict, OmegaConf]]:
+def apply_attn_impl(config: Union[ConfigDict, OmegaConf], attn_impl: str) -> None:
+    """
+    Override the attention implementation stored in `config.model`.
+
+    Only models exposing a `flash_attn` option are affected; for others a
+    non-default `attn_impl` is reported and ignored.
+
+    Args:
+        config (Union[ConfigDict, OmegaConf]): Loaded model configuration, modified in place.
+        attn_impl (str): 'flash' (fused SDPA), 'eager' (einsum attention) or 'config' (no change).
+    """
+    if attn_impl in (None, 'config'):
+        return
+    model_config = config.get('model', None)
+    if model_config is None or 'flash_attn' not in model_config:
+        print(f"attn_impl={attn_impl} ignored: model config has no flash_attn option")
+        return
+    model_config.flash_attn = attn_impl == 'flash'
+
+
+def get_model_from_config(model_type: str, config_path: str, attn_impl: str = 'config') -> Tuple[nn.Module, Union[ConfigDict, OmegaConf]]:
     """
     Load and instantiate a model using a configuration file.
 
@@ -284,6 +320,8 @@ def get_model_from_config(model_type: str, config_path: str) -> Tuple[nn.Module,
             'scnet', 'mel_band_conformer', etc.).
         config_path (str): Filesystem path to the configuration file used to
             initialize the model.
+        attn_impl (str, optional): Attention override applied via `apply_attn_impl`
+            before the model is built. Defaults to 'config' (no change).
 
     Returns:
         Tuple[nn.Module, Union[ConfigDict, OmegaConf]]: A tuple containing the
@@ -296,6 +334,7 @@ def get_model_from_config(model_type: str, config_path: str) -> Tuple[nn.Module,
     """
 
     config = load_config(model_type, config_path)
+    apply_attn_impl(config, attn_impl)
     if 'model_type' in config.training:
         model_type = config.training.model_type
     if model_type == 'mdx23c':